@@ -0,0 +1,81 @@
+"""
+Per-request overhead of the full Django stack vs the lean /api/ stack.
+
+    python -m benchmarks.api_stack --requests 5000
+
+Both handlers serve the same cached delivery detail, so the view itself does
+no SQL and the difference is middleware and authentication:
+
+* ``full``: ``MIDDLEWARE`` with session, CSRF, auth and messages middleware,
+  and the previous DRF authentication (token, session, basic), called with
+  a logged-in session cookie.
+* ``lean``: ``API_MIDDLEWARE`` and ``CachedTokenAuthentication``, called
+  with a token header.
+"""
+import argparse
+import time
+from unittest import mock
+
+from benchmarks.common import emit, percentiles, setup_django
+from benchmarks.suite import wsgi_request
+
+
+def run(application, path, headers, requests):
+    from delivery.middleware import REQUEST_QUERIES
+
+    labels = ('delivery-detail', 'GET')
+    wsgi_request(application, 'GET', path, headers=headers)  # Warm the delivery cache.
+    before = REQUEST_QUERIES.totals().get(labels, (0, 0))
+    samples, errors = [], 0
+    for _ in range(requests):
+        start = time.perf_counter()
+        errors += wsgi_request(application, 'GET', path, headers=headers) >= 400
+        samples.append(time.perf_counter() - start)
+    count, total = REQUEST_QUERIES.totals()[labels]
+    report = percentiles(samples)
+    report['errors'] = errors
+    report['queries_per_call'] = round((total - before[1]) / (count - before[0]), 2)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.contrib.auth.models import User
+    from django.core.handlers.wsgi import WSGIHandler
+    from django.test import Client
+    from rest_framework.authentication import BasicAuthentication, SessionAuthentication, TokenAuthentication
+    from rest_framework.authtoken.models import Token
+    from rest_framework.views import APIView
+
+    from delivery.models import Delivery
+    from delivery_api.handlers import APIWSGIHandler
+
+    user = User.objects.create_user('benchmark')
+    token = Token.objects.create(user=user)
+    client = Client()
+    client.force_login(user)
+    session = client.cookies[settings.SESSION_COOKIE_NAME].value
+    path = f'/api/deliveries/{Delivery.objects.create(order_id=1).id}/'
+
+    # Views copy DEFAULT_AUTHENTICATION_CLASSES when they are defined, so patch the attribute they inherit.
+    previous = [TokenAuthentication, SessionAuthentication, BasicAuthentication]
+    with mock.patch.object(APIView, 'authentication_classes', previous):
+        full = run(
+            WSGIHandler(), path, {'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={session}'}, args.requests
+        )
+    lean = run(APIWSGIHandler(), path, {'HTTP_AUTHORIZATION': f'Token {token.key}'}, args.requests)
+    emit({
+        'requests': args.requests,
+        'full': full,
+        'lean': lean,
+        'p50_speedup': round(full['p50_ms'] / lean['p50_ms'], 2),
+    })
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Sync (WSGI, fixed thread pool) vs async (ASGI, one event loop) throughput for
+the polling workload: detail reads mixed with order-delivery list reads.
+
+    python -m benchmarks.async_load --concurrency 100 250 500 1000
+
+Requests are dispatched in-process straight into the WSGI/ASGI callables, so
+the numbers compare the two request paths without any network or server.
+"""
+import argparse
+import asyncio
+import io
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.common import emit, percentiles, seed_deliveries, setup_django
+
+
+def wsgi_get(application, path, query=''):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.input': io.BytesIO()}
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0])
+
+
+async def asgi_get(application, path, query=''):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+        'root_path': '', 'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0),
+        'server': ('testserver', 80),
+    }
+    sent = []
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # The client never disconnects; the handler cancels this wait when it is done.
+        await asyncio.Future()
+
+    async def send(message):
+        sent.append(message)
+
+    await application(scope, receive, send)
+    return sent[0]['status']
+
+
+def workload(requests, rows, orders, seed=0):
+    rng = random.Random(seed)
+    plan = []
+    for _ in range(requests):
+        if rng.random() < 0.8:
+            plan.append((f'/api/deliveries/{rng.randrange(1, rows + 1)}/', ''))
+        else:
+            plan.append((f'/api/orders/{rng.randrange(1, orders + 1)}/deliveries/', 'page_size=20'))
+    return plan
+
+
+def run_sync(application, plan, threads):
+    def timed(request):
+        start = time.perf_counter()
+        status = wsgi_get(application, *request)
+        return time.perf_counter() - start, status
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(timed, plan))
+    return summarise(results, time.perf_counter() - start)
+
+
+def run_async(application, plan, concurrency):
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def timed(request):
+            async with semaphore:
+                start = time.perf_counter()
+                status = await asgi_get(application, *request)
+                return time.perf_counter() - start, status
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed(request) for request in plan))
+        return summarise(results, time.perf_counter() - start)
+
+    return asyncio.run(main())
+
+
+def summarise(results, elapsed):
+    report = percentiles([latency for latency, _ in results])
+    report['throughput_rps'] = round(len(results) / elapsed, 1)
+    report['errors'] = sum(status >= 400 for _, status in results)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[100, 250, 500, 1000])
+    parser.add_argument('--threads', type=int, default=32, help='Size of the WSGI worker thread pool.')
+    args = parser.parse_args()
+
+    setup_django()
+    orders = seed_deliveries(args.rows)
+    from delivery_api.asgi import application as asgi_application
+    from delivery_api.wsgi import application as wsgi_application
+
+    plan = workload(args.requests, args.rows, orders)
+    report = {'rows': args.rows, 'requests': args.requests, 'threads': args.threads, 'results': {}}
+    for concurrency in args.concurrency:
+        report['results'][concurrency] = {
+            'sync': run_sync(wsgi_application, plan, min(args.threads, concurrency)),
+            'async': run_async(asgi_application, plan, concurrency),
+        }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import json
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+import django
+
+STATUSES = ['on_hold', 'ready', 'on_the_way', 'delivered', 'cancelled']
+METHODS = ['standard', 'express', 'overnight']
+PAYMENTS = ['momo', 'cash']
+
+
+def setup_django(database=True):
+    """Configure Django and, unless ``database`` is false, create a throwaway test database."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'delivery_api.settings')
+    django.setup()
+    if database:
+        from django.db import connection
+        connection.creation.create_test_db(verbosity=0, keepdb=False)
+
+
+def use_sqlite_file(path):
+    """
+    Point the default SQLite database at a fresh file and migrate it. Unlike the
+    shared in-memory test database, a file takes concurrent writers from many threads.
+    """
+    from django.core.management import call_command
+    from django.db import DEFAULT_DB_ALIAS, connections
+
+    connections.close_all()
+    # New connections, including other threads', are built from this dict.
+    connections.settings[DEFAULT_DB_ALIAS]['NAME'] = path
+    call_command('migrate', verbosity=0)
+
+
+def seed_deliveries(rows, orders=None, seed=0):
+    """Insert ``rows`` deliveries spread over ``orders`` orders and the last 90 days."""
+    from django.db import connection, transaction
+    from django.utils import timezone
+    from delivery.models import Delivery
+
+    rng = random.Random(seed)
+    orders = orders or max(rows // 5, 1)
+    now = timezone.now()
+    table = Delivery._meta.db_table
+    columns = ['order_id', 'payment_method', 'status', 'current_location',
+               'estimated_delivery_time', 'delivery_method', 'created_at', 'updated_at']
+    sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+        table, ', '.join(columns), ', '.join(['%s'] * len(columns))
+    )
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for _ in range(rows):
+            created = now - timedelta(seconds=rng.randrange(90 * 24 * 3600))
+            batch.append((
+                rng.randrange(1, orders + 1), rng.choice(PAYMENTS), rng.choice(STATUSES),
+                'Accra', created + timedelta(days=2), rng.choice(METHODS),
+                created, created + timedelta(seconds=rng.randrange(3600)),
+            ))
+            if len(batch) >= 10000:
+                cursor.executemany(sql, batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+    return orders
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+
+    def pick(q):
+        return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+    return {
+        'count': len(samples),
+        'p50_ms': round(pick(0.50) * 1000, 3),
+        'p95_ms': round(pick(0.95) * 1000, 3),
+        'p99_ms': round(pick(0.99) * 1000, 3),
+    }
+
+
+def time_calls(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return percentiles(samples)
+
+
+def emit(report):
+    json.dump(report, sys.stdout, indent=2, default=str)
+    sys.stdout.write('\n')
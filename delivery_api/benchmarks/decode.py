@@ -0,0 +1,59 @@
+"""
+Messages per second the consumer's decode stage (parse + validate) sustains
+with each installed JSON backend. No broker or database is involved.
+
+    python -m benchmarks.decode --messages 200000
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import METHODS, PAYMENTS, STATUSES, emit, setup_django
+
+
+def make_messages(count, seed=0):
+    rng = random.Random(seed)
+    return [
+        json.dumps([[{'order_data': {
+            'id': rng.randrange(1, 10 ** 6),
+            'payment_method': rng.choice(PAYMENTS),
+            'status': rng.choice(STATUSES),
+            'address': f'{rng.randrange(1, 500)} Independence Avenue, Accra',
+            'delivery_method': rng.choice(METHODS),
+            'customer': {'name': 'Ama', 'phone': '+233200000000'},
+            'items': [{'sku': f'SKU-{i}', 'quantity': 1} for i in range(rng.randrange(1, 6))],
+        }}, 200]]).encode('utf-8')
+        for _ in range(count)
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from delivery.decoders import get_decoder, msgspec, orjson
+
+    messages = make_messages(args.messages)
+    backends = ['json'] + (['orjson'] if orjson else []) + (['msgspec'] if msgspec else [])
+    report = {'messages': args.messages, 'backends': {}}
+    for backend in backends:
+        decode = get_decoder(backend).decode
+        best = float('inf')
+        for _ in range(args.rounds):
+            start = time.perf_counter()
+            for body in messages:
+                decode(body)
+            best = min(best, time.perf_counter() - start)
+        report['backends'][backend] = {
+            'messages_per_second': round(args.messages / best),
+            'microseconds_per_message': round(best / args.messages * 10 ** 6, 3),
+        }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
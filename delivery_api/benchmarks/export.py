@@ -0,0 +1,51 @@
+"""
+Throughput and peak memory of the streaming delivery export.
+
+    python -m benchmarks.export --rows 10000 100000 1000000
+
+For each size the table is seeded and exported in both formats through the
+same generator the export endpoint uses. Peak memory is measured with
+tracemalloc, which also slows the run down, and should stay flat as the
+row count grows.
+"""
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.common import emit, seed_deliveries, setup_django
+
+
+def run(export_format):
+    from delivery.export import EXPORT_CHUNK_SIZE, export_queryset, stream_export
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    for chunk in stream_export(export_queryset().iterator(chunk_size=EXPORT_CHUNK_SIZE), export_format):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'seconds': round(elapsed, 2), 'megabytes': round(size / 2 ** 20, 1), 'peak_memory_kb': peak // 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    args = parser.parse_args()
+
+    setup_django()
+    from delivery.models import Delivery
+
+    report = {}
+    for rows in args.rows:
+        Delivery.objects.all().delete()
+        seed_deliveries(rows)
+        results = report[rows] = {export_format: run(export_format) for export_format in ('csv', 'ndjson')}
+        for result in results.values():
+            result['rows_per_second'] = round(rows / result['seconds'])
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
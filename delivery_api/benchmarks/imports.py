@@ -0,0 +1,79 @@
+"""
+Throughput of the import_deliveries pipeline by parsing worker count.
+
+    python -m benchmarks.imports --rows 200000 --workers 0 2 4
+
+Writes a CSV and an NDJSON file of ``--rows`` synthetic deliveries (1% of
+them invalid) and imports each into an empty table with every worker count.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import METHODS, PAYMENTS, STATUSES, emit, setup_django
+
+
+def make_rows(rows, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    for index in range(rows):
+        yield {
+            'order_id': rng.randrange(1, rows) if index % 100 else 'not-a-number',
+            'payment_method': rng.choice(PAYMENTS),
+            'status': rng.choice(STATUSES),
+            'current_location': f'{rng.randrange(1, 500)} Ring Road, Accra',
+            'delivery_method': rng.choice(METHODS),
+            'created_at': (start + timedelta(minutes=index)).isoformat(),
+        }
+
+
+def write_files(directory, rows):
+    paths = {'csv': os.path.join(directory, 'deliveries.csv'), 'ndjson': os.path.join(directory, 'deliveries.ndjson')}
+    with open(paths['csv'], 'w', newline='') as f:
+        writer = None
+        for row in make_rows(rows):
+            if writer is None:
+                writer = csv.DictWriter(f, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+    with open(paths['ndjson'], 'w') as f:
+        for row in make_rows(rows):
+            f.write(json.dumps(row) + '\n')
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[0, 2, 4])
+    parser.add_argument('--chunk-size', type=int, default=2000)
+    args = parser.parse_args()
+
+    setup_django()
+    from delivery.importer import import_file
+    from delivery.models import Delivery
+
+    report = {'rows': args.rows, 'chunk_size': args.chunk_size, 'results': {}}
+    with tempfile.TemporaryDirectory() as directory:
+        for import_format, path in write_files(directory, args.rows).items():
+            results = report['results'][import_format] = {}
+            for workers in args.workers:
+                Delivery.objects.all().delete()
+                with open(path, newline='') as f:
+                    result = import_file(f, io.StringIO(), import_format, workers, args.chunk_size)
+                results[workers] = {
+                    'seconds': round(result.seconds, 2),
+                    'rows_per_second': round(result.rows_per_second),
+                    'imported': result.imported,
+                    'rejected': result.rejected,
+                }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Query plans and latencies for the Delivery lookups before the 0007 index
+migration and with every migration applied.
+
+    python -m benchmarks.indexes --rows 1000000
+"""
+import argparse
+import random
+
+from benchmarks.common import emit, seed_deliveries, setup_django, time_calls
+
+
+def queries(orders, rng):
+    from datetime import timedelta
+    from django.utils import timezone
+    from delivery.models import ACTIVE_STATUSES, Delivery
+
+    cutoff = timezone.now() - timedelta(days=30)
+    # Only columns that exist at 0006, so the "before" schema can run the same queries.
+    deliveries = Delivery.objects.values('id', 'order_id', 'status', 'created_at', 'updated_at')
+    return {
+        'order_deliveries': lambda: deliveries.filter(
+            order_id=rng.randrange(1, orders + 1)
+        ).order_by('created_at', 'id'),
+        'status_recent': lambda: deliveries.filter(status='ready').order_by('-updated_at')[:100],
+        'active_stale': lambda: deliveries.filter(
+            status__in=ACTIVE_STATUSES, updated_at__lt=cutoff
+        ).order_by('updated_at')[:100],
+    }
+
+
+def measure(orders, repeat):
+    rng = random.Random(1)
+    results = {}
+    for name, build in queries(orders, rng).items():
+        results[name] = {
+            'plan': build().explain(),
+            'latency': time_calls(lambda: list(build()), repeat),
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.core.management import call_command
+
+    call_command('migrate', 'delivery', '0006', verbosity=0)
+    orders = seed_deliveries(args.rows)
+    before = measure(orders, args.repeat)
+    call_command('migrate', 'delivery', verbosity=0)
+    after = measure(orders, args.repeat)
+    emit({'rows': args.rows, 'before': before, 'after': after})
+
+
+if __name__ == '__main__':
+    main()
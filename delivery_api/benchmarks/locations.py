@@ -0,0 +1,117 @@
+"""
+Courier location pings: one write per ping against coalesced flushes.
+
+    python -m benchmarks.locations --deliveries 1000 --pings 20000 --flush-every 5000
+
+``per_ping`` applies every ping with ``update_delivery``, the way a PATCH of
+``current_location`` does. ``coalesced`` feeds the same pings to a
+``LocationCoalescer`` and flushes it every ``--flush-every`` pings, standing
+in for the one second flush interval at that ping rate. Both report pings
+per second and SQL statements per ping, and must leave every delivery at
+its latest location.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.common import emit, seed_deliveries, setup_django, use_sqlite_file
+from benchmarks.suite import QueryCounter
+
+
+def make_pings(ids, count, seed, start):
+    from delivery.locations import LocationPing
+
+    rng = random.Random(seed)
+    return [
+        LocationPing(rng.choice(ids), f'{rng.uniform(5.5, 5.7):.5f},{rng.uniform(-0.3, -0.1):.5f}',
+                     start + timedelta(milliseconds=index))
+        for index in range(count)
+    ]
+
+
+def latest_locations(pings):
+    return {ping.delivery_id: ping.location for ping in pings}
+
+
+def run_per_ping(pings):
+    from delivery.models import Delivery
+    from delivery.transitions import update_delivery
+
+    deliveries = Delivery.objects.in_bulk({ping.delivery_id for ping in pings})
+    for ping in pings:
+        update_delivery(deliveries[ping.delivery_id], current_location=ping.location)
+
+
+def run_coalesced(pings, flush_every, history):
+    from delivery.locations import LocationCoalescer
+
+    coalescer = LocationCoalescer(history=history, autostart=False)
+    for index, ping in enumerate(pings, 1):
+        coalescer.add(ping)
+        if index % flush_every == 0:
+            coalescer.flush()
+    coalescer.flush()
+
+
+def measure(run, pings):
+    from django.db import connection
+    from delivery.models import Delivery
+
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        run()
+    elapsed = time.perf_counter() - start
+    expected = latest_locations(pings)
+    stored = dict(Delivery.objects.filter(id__in=expected).values_list('id', 'current_location'))
+    return {
+        'pings_per_second': round(len(pings) / elapsed, 1),
+        'queries_per_ping': round(counter.count / len(pings), 4),
+        'stale_locations': sum(stored[pk] != location for pk, location in expected.items()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deliveries', type=int, default=1000)
+    parser.add_argument('--pings', type=int, default=20000)
+    parser.add_argument('--flush-every', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from django.db import connection
+    from django.utils import timezone
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            use_sqlite_file(os.path.join(directory, 'locations.sqlite3'))
+        else:
+            connection.creation.create_test_db(verbosity=0, keepdb=False)
+        seed_deliveries(args.deliveries, seed=args.seed)
+        from delivery.models import ACTIVE_STATUSES, Delivery
+
+        ids = list(Delivery.objects.filter(status__in=ACTIVE_STATUSES).values_list('id', flat=True))
+        report = {
+            'vendor': connection.vendor,
+            'deliveries': len(ids),
+            'pings': args.pings,
+            'flush_every': args.flush_every,
+        }
+        # Each run's pings are recorded an hour after the previous run's, so they are newer than the
+        # locations already stored, and all in the past, since future timestamps are clamped to now.
+        start = timezone.now() - timedelta(hours=3)
+        pings = make_pings(ids, args.pings, args.seed, start)
+        report['per_ping'] = measure(lambda: run_per_ping(pings), pings)
+        pings = make_pings(ids, args.pings, args.seed + 1, start + timedelta(hours=1))
+        report['coalesced'] = measure(lambda: run_coalesced(pings, args.flush_every, False), pings)
+        pings = make_pings(ids, args.pings, args.seed + 2, start + timedelta(hours=2))
+        report['coalesced_with_history'] = measure(lambda: run_coalesced(pings, args.flush_every, True), pings)
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Nearby search: geohash-pruned candidates against ranking every active delivery.
+
+    python -m benchmarks.nearby --rows 200000 --queries 200 --radius 1000 5000
+
+Seeds ``--rows`` deliveries scattered over a city about 40 km across, then
+runs ``--queries`` random searches per radius. ``indexed`` is ``nearby()``,
+which only ranks the deliveries in the geohash cells around the point;
+``scan`` fetches and ranks the coordinates of every active delivery. Both
+report latency percentiles and the candidates ranked per query, and the
+indexed results must match the scan's. The plan of the candidate query is
+included to show the geohash index in use.
+"""
+import argparse
+import heapq
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.common import emit, percentiles, seed_deliveries, setup_django, use_sqlite_file
+
+# Accra, and the spread of the seeded coordinates in degrees either side.
+CENTRE = (5.6037, -0.1870)
+SPREAD = 0.18
+
+
+def place_deliveries(seed):
+    from django.db import transaction
+    from delivery.geo import encode
+    from delivery.models import Delivery
+
+    rng = random.Random(seed)
+    deliveries = []
+    for pk in Delivery.objects.values_list('id', flat=True).iterator(chunk_size=10000):
+        latitude = CENTRE[0] + rng.uniform(-SPREAD, SPREAD)
+        longitude = CENTRE[1] + rng.uniform(-SPREAD, SPREAD)
+        deliveries.append(Delivery(id=pk, latitude=latitude, longitude=longitude, geohash=encode(latitude, longitude)))
+    with transaction.atomic():
+        Delivery.objects.bulk_update(deliveries, ['latitude', 'longitude', 'geohash'], batch_size=1000)
+
+
+def scan(latitude, longitude, radius, limit):
+    from delivery.geo import haversine
+    from delivery.models import ACTIVE_STATUSES, Delivery
+
+    rows = list(Delivery.objects.filter(status__in=ACTIVE_STATUSES, latitude__isnull=False)
+                .values_list('id', 'latitude', 'longitude'))
+    ids, latitudes, longitudes = zip(*rows)
+    distances = haversine(latitude, longitude, latitudes, longitudes)
+    ranked = heapq.nsmallest(limit, ((distance, pk) for pk, distance in zip(ids, distances) if distance <= radius))
+    return [pk for _, pk in ranked], len(rows)
+
+
+def indexed(latitude, longitude, radius, limit):
+    from delivery.nearby import nearby, nearby_candidates
+
+    return ([delivery.id for delivery, _ in nearby(latitude, longitude, radius, limit)],
+            nearby_candidates(latitude, longitude, radius).count())
+
+
+def query_plan(radius):
+    from django.db import connection
+    from delivery.nearby import nearby_candidates
+
+    sql, params = nearby_candidates(CENTRE[0], CENTRE[1], radius).query.sql_with_params()
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def run(strategy, points, radius, limit):
+    samples, candidates, results = [], 0, []
+    for latitude, longitude in points:
+        start = time.perf_counter()
+        ids, examined = strategy(latitude, longitude, radius, limit)
+        samples.append(time.perf_counter() - start)
+        candidates += examined
+        results.append(ids)
+    report = percentiles(samples)
+    report['candidates_per_query'] = round(candidates / len(points), 1)
+    return report, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--radius', type=float, nargs='+', default=[1000, 5000])
+    parser.add_argument('--limit', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from django.db import connection
+    from delivery.geo import numpy
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            use_sqlite_file(os.path.join(directory, 'nearby.sqlite3'))
+        else:
+            connection.creation.create_test_db(verbosity=0, keepdb=False)
+        seed_deliveries(args.rows, seed=args.seed)
+        place_deliveries(args.seed)
+
+        rng = random.Random(args.seed)
+        points = [(CENTRE[0] + rng.uniform(-SPREAD, SPREAD), CENTRE[1] + rng.uniform(-SPREAD, SPREAD))
+                  for _ in range(args.queries)]
+        report = {'vendor': connection.vendor, 'rows': args.rows, 'numpy': numpy is not None, 'results': {}}
+        for radius in args.radius:
+            scanned, expected = run(scan, points, radius, args.limit)
+            pruned, found = run(indexed, points, radius, args.limit)
+            report['results'][radius] = {
+                'scan': scanned,
+                'indexed': pruned,
+                'mismatches': sum(a != b for a, b in zip(expected, found)),
+                'plan': query_plan(radius),
+            }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
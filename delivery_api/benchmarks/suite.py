@@ -0,0 +1,283 @@
+"""
+End-to-end benchmark of the API endpoints and the order consumer.
+
+    python -m benchmarks.suite --rows 100000 --requests 2000 --concurrency 8 \
+        --output report.json [--baseline previous.json]
+
+Seeds ``--rows`` deliveries, then drives the create, detail, PUT, PATCH and
+order-list endpoints through the WSGI application from ``--concurrency``
+threads, and pushes synthetic order messages through ``on_message_received``
+and the batched consumer using an in-memory channel stub. Every scenario
+reports p50/p95/p99 latency, throughput and SQL queries per call.
+
+With ``--baseline`` the run is compared against an earlier report, and the
+command exits with status 1 if a scenario's p95, throughput or query count
+regressed by more than ``--tolerance``.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from wsgiref.util import setup_testing_defaults
+
+from benchmarks.common import (
+    METHODS, PAYMENTS, STATUSES, emit, percentiles, seed_deliveries, setup_django, use_sqlite_file,
+)
+from benchmarks.decode import make_messages
+
+
+def wsgi_request(application, method, path, query='', body=None, headers=None):
+    """Call ``application`` in-process and return the status code. ``headers`` holds extra WSGI environ keys."""
+    data = json.dumps(body).encode('utf-8') if body is not None else b''
+    environ = {
+        'REQUEST_METHOD': method, 'PATH_INFO': path, 'QUERY_STRING': query, 'wsgi.input': io.BytesIO(data),
+        'CONTENT_TYPE': 'application/json', 'CONTENT_LENGTH': str(len(data)), **(headers or {}),
+    }
+    setup_testing_defaults(environ)
+    statuses = []
+    response = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+    b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0])
+
+
+def api_scenarios(rows, orders):
+    """Scenario name -> (view name and method in the request metrics, request factory)."""
+    def create(rng):
+        body = {'order_id': rng.randrange(1, orders + 1), 'payment_method': rng.choice(PAYMENTS),
+                'delivery_method': rng.choice(METHODS)}
+        return 'POST', '/api/deliveries/', '', body
+
+    def detail(rng):
+        return 'GET', f'/api/deliveries/{rng.randrange(1, rows + 1)}/', '', None
+
+    def put(rng):
+        return 'PUT', f'/api/deliveries/{rng.randrange(1, rows + 1)}/', '', {'status': rng.choice(STATUSES)}
+
+    def patch(rng):
+        body = {'current_location': f'{rng.randrange(1, 500)} Ring Road, Accra'}
+        return 'PATCH', f'/api/deliveries/{rng.randrange(1, rows + 1)}/', '', body
+
+    def order_list(rng):
+        return 'GET', f'/api/orders/{rng.randrange(1, orders + 1)}/deliveries/', 'page_size=20', None
+
+    return {
+        'create': (('create-delivery', 'POST'), create),
+        'detail': (('delivery-detail', 'GET'), detail),
+        'put': (('delivery-detail', 'PUT'), put),
+        'patch': (('delivery-detail', 'PATCH'), patch),
+        'order_list': (('order-deliveries', 'GET'), order_list),
+    }
+
+
+def queries_per_request(labels, before):
+    from delivery.middleware import REQUEST_QUERIES
+
+    count, total = REQUEST_QUERIES.totals().get(labels, (0, 0))
+    count, total = count - before[0], total - before[1]
+    return round(total / count, 2) if count else None
+
+
+def run_api_scenario(application, labels, factory, requests, concurrency, seed):
+    from delivery.middleware import REQUEST_QUERIES
+
+    rng = random.Random(seed)
+    plan = [factory(rng) for _ in range(requests)]
+
+    def timed(request):
+        start = time.perf_counter()
+        status = wsgi_request(application, *request)
+        return time.perf_counter() - start, status
+
+    before = REQUEST_QUERIES.totals().get(labels, (0, 0))
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, plan))
+    elapsed = time.perf_counter() - start
+
+    report = percentiles([latency for latency, _ in results])
+    report['throughput_per_second'] = round(len(results) / elapsed, 1)
+    report['errors'] = sum(status >= 400 for _, status in results)
+    report['queries_per_call'] = queries_per_request(labels, before)
+    return report
+
+
+def on_message_received(ch, method, properties, body):
+    """The original consumer: one transaction and one ack per message, kept as the baseline."""
+    from django.db import IntegrityError, transaction
+    from delivery.consumer import parse_order_message
+
+    try:
+        delivery = parse_order_message(body, properties)
+        with transaction.atomic():
+            delivery.save()
+    except IntegrityError:
+        pass  # Already ingested.
+    ch.basic_ack(delivery_tag=method.delivery_tag)
+
+
+class StubChannel:
+    """Just enough of a pika channel for ``on_message_received`` and ``BatchConsumer``."""
+
+    def __init__(self, bodies=(), stop_event=None):
+        self.bodies = bodies
+        self.stop_event = stop_event
+        self.acked = 0
+
+    def basic_qos(self, prefetch_count):
+        pass
+
+    def consume(self, queue, inactivity_timeout=None):
+        for tag, body in enumerate(self.bodies, 1):
+            yield SimpleNamespace(delivery_tag=tag, redelivered=False), None, body
+        self.stop_event.set()
+        yield None, None, None
+
+    def basic_ack(self, delivery_tag, multiple=False):
+        self.acked += 1
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        pass
+
+    def basic_nack(self, delivery_tag, multiple=False, requeue=True):
+        pass
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        pass
+
+    def cancel(self):
+        pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def run_consumer_scenarios(messages, batch_size):
+    from django.db import connection
+    from delivery.consumer import BatchConsumer
+
+    report = {}
+    bodies = make_messages(messages, seed=1)
+    channel = StubChannel()
+    samples = []
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        for tag, body in enumerate(bodies, 1):
+            began = time.perf_counter()
+            on_message_received(channel, SimpleNamespace(delivery_tag=tag), None, body)
+            samples.append(time.perf_counter() - began)
+    elapsed = time.perf_counter() - start
+    report['per_message'] = percentiles(samples)
+    report['per_message'].update({
+        'throughput_per_second': round(len(bodies) / elapsed, 1),
+        'queries_per_call': round(counter.count / len(bodies), 2),
+    })
+
+    # Fresh bodies, so that the batch run is not answered by the unique idempotency key.
+    bodies = make_messages(messages, seed=2)
+    stop_event = threading.Event()
+    consumer = BatchConsumer(StubChannel(bodies, stop_event), 'delivery_queue', batch_size=batch_size,
+                             flush_interval=60, stop_event=stop_event)
+    counter = QueryCounter()
+    start = time.perf_counter()
+    with connection.execute_wrapper(counter):
+        consumer.run()
+    elapsed = time.perf_counter() - start
+    report['batched'] = {
+        'count': len(bodies),
+        'batch_size': batch_size,
+        'throughput_per_second': round(len(bodies) / elapsed, 1),
+        'queries_per_call': round(counter.count / len(bodies), 3),
+    }
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """List the scenarios that got slower, lost throughput or issue more queries than ``baseline``."""
+    regressions = []
+    for section in ('api', 'consumer'):
+        for scenario, current in report[section].items():
+            previous = baseline.get(section, {}).get(scenario)
+            if not previous:
+                continue
+            if 'p95_ms' in previous and current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+                regressions.append(f"{section}.{scenario}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+            if current['throughput_per_second'] < previous['throughput_per_second'] * (1 - tolerance):
+                regressions.append(
+                    f"{section}.{scenario}: throughput {previous['throughput_per_second']} -> "
+                    f"{current['throughput_per_second']}/s"
+                )
+            if (current['queries_per_call'] or 0) > (previous['queries_per_call'] or 0):
+                regressions.append(
+                    f"{section}.{scenario}: queries {previous['queries_per_call']} -> {current['queries_per_call']}"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--requests', type=int, default=2000, help='Requests per API scenario.')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--messages', type=int, default=5000, help='Order messages per consumer scenario.')
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Also write the JSON report to this file.')
+    parser.add_argument('--baseline', help='Earlier report to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    import django
+    from django.db import connection
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            use_sqlite_file(os.path.join(directory, 'suite.sqlite3'))
+        else:
+            connection.creation.create_test_db(verbosity=0, keepdb=False)
+        orders = seed_deliveries(args.rows, seed=args.seed)
+        from delivery_api.wsgi import application
+
+        report = {
+            'meta': {
+                'rows': args.rows, 'requests': args.requests, 'concurrency': args.concurrency,
+                'messages': args.messages, 'vendor': connection.vendor,
+                'python': platform.python_version(), 'django': django.get_version(),
+            },
+            'api': {},
+        }
+        for index, (name, (labels, factory)) in enumerate(api_scenarios(args.rows, orders).items()):
+            report['api'][name] = run_api_scenario(
+                application, labels, factory, args.requests, args.concurrency, args.seed + index
+            )
+        report['consumer'] = run_consumer_scenarios(args.messages, args.batch_size)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    emit(report)
+    if report.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""
+Contention on status transitions: many updaters race to move the same
+deliveries through on_hold -> ready -> on_the_way -> delivered, each
+occasionally cancelling instead.
+
+    python -m benchmarks.transitions --deliveries 200 --updaters 1 4 16
+
+Every updater reads a delivery and applies the next transition through
+``update_delivery``; losing a race surfaces as a conflict instead of a lost
+update. Afterwards the outbox is checked: every delivery must have a single
+chain of legal transitions ending in a final status.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.common import emit, percentiles, setup_django, use_sqlite_file
+
+NEXT_STATUS = {'on_hold': 'ready', 'ready': 'on_the_way', 'on_the_way': 'delivered'}
+
+
+def update(ids, seed, samples, counts, lock):
+    from django.db import OperationalError, connection
+    from delivery.models import Delivery
+    from delivery.transitions import TransitionConflict, update_delivery
+
+    rng = random.Random(seed)
+    local = {'applied': 0, 'conflicts': 0, 'locked': 0}
+    try:
+        while True:
+            active = list(Delivery.objects.filter(id__in=ids, status__in=NEXT_STATUS))
+            if not active:
+                break
+            rng.shuffle(active)
+            for delivery in active:
+                new_status = 'cancelled' if rng.random() < 0.05 else NEXT_STATUS[delivery.status]
+                start = time.perf_counter()
+                try:
+                    update_delivery(delivery, status=new_status)
+                except TransitionConflict:
+                    local['conflicts'] += 1
+                except OperationalError:
+                    local['locked'] += 1
+                else:
+                    local['applied'] += 1
+                    samples.append(time.perf_counter() - start)
+    finally:
+        connection.close()
+    with lock:
+        for key, value in local.items():
+            counts[key] += value
+
+
+def check_history(ids):
+    """Return the deliveries whose outbox events are not one legal chain ending in a final status."""
+    from delivery.models import Delivery, OutboxEvent
+    from delivery.transitions import TRANSITIONS
+
+    history = {}
+    for payload in OutboxEvent.objects.order_by('id').values_list('payload', flat=True):
+        history.setdefault(payload['delivery_id'], []).append((payload['previous_status'], payload['status']))
+    final = dict(Delivery.objects.filter(id__in=ids).values_list('id', 'status'))
+    broken = []
+    for pk in ids:
+        current = 'on_hold'
+        for previous, new_status in history.get(pk, []):
+            if previous != current or new_status not in TRANSITIONS[previous]:
+                broken.append(pk)
+                break
+            current = new_status
+        else:
+            if current != final[pk] or TRANSITIONS[current]:
+                broken.append(pk)
+    return broken
+
+
+def run(deliveries, updaters):
+    from delivery.models import Delivery, OutboxEvent
+
+    ids = [Delivery.objects.create(order_id=index).id for index in range(deliveries)]
+    samples, counts, lock = [], {'applied': 0, 'conflicts': 0, 'locked': 0}, threading.Lock()
+    threads = [
+        threading.Thread(target=update, args=(ids, seed, samples, counts, lock)) for seed in range(updaters)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = percentiles(samples)
+    report.update(counts)
+    report['transitions_per_second'] = round(counts['applied'] / elapsed, 1)
+    report['broken_histories'] = len(check_history(ids))
+    OutboxEvent.objects.all().delete()
+    Delivery.objects.all().delete()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--deliveries', type=int, default=200)
+    parser.add_argument('--updaters', type=int, nargs='+', default=[1, 4, 16])
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from django.db import connection
+
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            use_sqlite_file(os.path.join(directory, 'transitions.sqlite3'))
+        else:
+            connection.creation.create_test_db(verbosity=0, keepdb=False)
+        report = {
+            'vendor': connection.vendor,
+            'deliveries': args.deliveries,
+            'results': {updaters: run(args.deliveries, updaters) for updaters in args.updaters},
+        }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Writer throughput with concurrent writers: API-style single-row saves and
+consumer-style bulk inserts running in parallel threads, each thread on its
+own database connection.
+
+    python -m benchmarks.writers --writers 1 4 8 16 --rows 2000
+
+With SQLite every run uses a fresh database file, once with the rollback
+journal and once in WAL mode. Set DATABASE_URL to a PostgreSQL server to
+measure that instead.
+"""
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+from benchmarks.common import emit, percentiles, setup_django, use_sqlite_file
+
+
+def write(writer, rows, batch_size, samples, errors):
+    from django.db import OperationalError, connection
+    from delivery.bulk import bulk_create_deliveries
+    from delivery.models import Delivery
+
+    try:
+        # Even writers behave like API requests, odd ones like the order consumer.
+        for start in range(0, rows, 1 if writer % 2 == 0 else batch_size):
+            began = time.perf_counter()
+            try:
+                if writer % 2 == 0:
+                    Delivery.objects.create(order_id=writer)
+                else:
+                    count = min(batch_size, rows - start)
+                    bulk_create_deliveries([Delivery(order_id=writer) for _ in range(count)])
+            except OperationalError:
+                errors.append(writer)
+            else:
+                samples.append(time.perf_counter() - began)
+    finally:
+        connection.close()
+
+
+def run(writers, rows, batch_size):
+    from delivery.models import Delivery
+
+    samples, errors = [], []
+    threads = [
+        threading.Thread(target=write, args=(writer, rows, batch_size, samples, errors))
+        for writer in range(writers)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    inserted = Delivery.objects.count()
+    Delivery.objects.all().delete()
+    report = percentiles(samples)
+    report.update({
+        'rows_inserted': inserted,
+        'rows_per_second': round(inserted / elapsed, 1),
+        'locked_errors': len(errors),
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--rows', type=int, default=2000, help='Rows inserted by each writer.')
+    parser.add_argument('--batch-size', type=int, default=100, help='Rows per bulk insert for consumer-style writers.')
+    args = parser.parse_args()
+
+    setup_django(database=False)
+    from django.db import connection
+    from django.test import override_settings
+
+    report = {'vendor': connection.vendor, 'rows_per_writer': args.rows, 'batch_size': args.batch_size, 'results': {}}
+    if connection.vendor != 'sqlite':
+        connection.creation.create_test_db(verbosity=0, keepdb=False)
+        report['results']['default'] = {writers: run(writers, args.rows, args.batch_size) for writers in args.writers}
+        emit(report)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode, wal in (('rollback_journal', False), ('wal', True)):
+            with override_settings(SQLITE_WAL=wal):
+                use_sqlite_file(os.path.join(directory, f'{mode}.sqlite3'))
+                report['results'][mode] = {
+                    writers: run(writers, args.rows, args.batch_size) for writers in args.writers
+                }
+    emit(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete
 
 
 class DeliveryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'delivery'
+
+    def ready(self):
+        from rest_framework.authtoken.models import Token
+
+        from delivery_api.database import configure_sqlite
+
+        from .authentication import forget_token
+        from .metrics import install_query_recorder
+
+        connection_created.connect(configure_sqlite)
+        connection_created.connect(install_query_recorder)
+        post_delete.connect(forget_token, sender=Token)
@@ -0,0 +1,25 @@
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+
+from . import urls
+from .async_views import (
+    AsyncDeliveryCreateView, AsyncDeliveryDetailView, AsyncDeliveryExportView, AsyncDeliveryLocationView,
+    AsyncDeliveryStreamView, AsyncOrderDeliveriesListView,
+)
+
+ASYNC_VIEWS = {
+    'create-delivery': csrf_exempt(AsyncDeliveryCreateView.as_view()),
+    'delivery-detail': csrf_exempt(AsyncDeliveryDetailView.as_view()),
+    'order-deliveries': AsyncOrderDeliveriesListView.as_view(),
+    'export-deliveries': AsyncDeliveryExportView.as_view(),
+    'delivery-location': csrf_exempt(AsyncDeliveryLocationView.as_view()),
+}
+
+# Same routes, names and order as delivery.urls, with the async views swapped in,
+# plus the live stream, which needs an async server to hold connections open.
+urlpatterns = [
+    path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name) if pattern.name in ASYNC_VIEWS else pattern
+    for pattern in urls.urlpatterns
+] + [
+    path('deliveries/<str:delivery_id>/stream/', AsyncDeliveryStreamView.as_view(), name='delivery-stream'),
+]
@@ -0,0 +1,260 @@
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.encoders import JSONEncoder
+
+from .cache import delivery_cache
+from .conditional import aqueryset_etag, delivery_etag, not_modified
+from .export import (
+    EXPORT_CHUNK_SIZE, EXPORT_CONTENT_TYPES, astream_export, export_queryset, parse_export_filters, parse_export_format,
+)
+from .live import DeliveryEvent, TooManySubscribers, delivery_updates
+from .models import Delivery
+from .pagination import KeysetPagination
+from .routers import read_replica
+from .serializers import DeliveryResponseSerializer
+from .views import (
+    DeliveryCreateView, DeliveryDetailView, accept_location_ping, parse_projection, project, projection_values, read_from_primary,
+)
+
+# Async counterparts of the read-heavy views in views.py, served when the
+# project runs under ASGI (see delivery_api/asgi.py). They return the same
+# payloads as the DRF views, using DRF's encoder so dates render identically.
+
+
+def json_response(data, status=200, headers=None):
+    return JsonResponse(data, status=status, headers=headers, encoder=JSONEncoder, safe=False)
+
+
+def delivery_not_found():
+    return json_response({'detail': 'No Delivery matches the given query.'}, status=404)
+
+
+# DRF's parsers accept JSON, form and multipart bodies and word errors its own way,
+# so creates go through the DRF view, as detail writes do.
+sync_create_view = sync_to_async(DeliveryCreateView.as_view())
+
+
+class AsyncDeliveryCreateView(View):
+    async def post(self, request, *args, **kwargs):
+        return await sync_create_view(request, *args, **kwargs)
+
+
+class AsyncReplicaReadMixin:
+    """Async counterpart of ``ReplicaReadMixin``."""
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return await super().dispatch(request, *args, **kwargs)
+        with read_replica():
+            return await super().dispatch(request, *args, **kwargs)
+
+
+# Writes are rare next to polling reads, so they keep using the DRF view.
+sync_detail_view = sync_to_async(DeliveryDetailView.as_view())
+
+
+class AsyncDeliveryDetailView(AsyncReplicaReadMixin, View):
+    async def get(self, request, delivery_id):
+        entry = await delivery_cache.aget(delivery_id)
+        if entry is None:
+            version = await delivery_cache.aversion(delivery_id)
+            try:
+                instance = await Delivery.objects.aget(pk=delivery_id)
+            except (Delivery.DoesNotExist, ValueError):
+                return delivery_not_found()
+            etag, payload = delivery_etag(instance), None
+        else:
+            etag, payload = entry
+
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if payload is None:
+            payload = dict(DeliveryResponseSerializer(instance).data)
+            if read_from_primary(instance):
+                await delivery_cache.aset(instance.pk, (etag, payload), version)
+        return json_response(
+            {
+                "message": "Delivery information retrieved successfully",
+                "delivery": payload
+            },
+            headers={'ETag': etag}
+        )
+
+    async def put(self, request, *args, **kwargs):
+        return await sync_detail_view(request, *args, **kwargs)
+
+    async def patch(self, request, *args, **kwargs):
+        return await sync_detail_view(request, *args, **kwargs)
+
+
+class AsyncOrderDeliveriesListView(AsyncReplicaReadMixin, View):
+    async def get(self, request, orderId):
+        try:
+            fields = parse_projection(request.GET.get('fields'))
+        except ValidationError as e:
+            return json_response(e.detail, status=400)
+
+        queryset = Delivery.objects.filter(order_id=orderId)
+        etag = await aqueryset_etag(queryset, request.META.get('QUERY_STRING', ''))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        paginator = KeysetPagination()
+        try:
+            rows = paginator.get_slice(projection_values(queryset, fields), request)
+        except NotFound as e:
+            return json_response({'detail': e.detail}, status=404)
+        page = paginator.paginate_rows([row async for row in rows])
+        return json_response(
+            {
+                "message": "Delivery information for order retrieved successfully",
+                "deliveries": project(page, fields),
+                "next": paginator.get_next_link()
+            },
+            headers={'ETag': etag}
+        )
+
+
+class AsyncDeliveryExportView(AsyncReplicaReadMixin, View):
+    """
+    Async counterpart of ``DeliveryExportView``. Under ASGI a synchronous
+    iterator would be read into memory before sending, so the export is
+    streamed from an async generator instead.
+    """
+
+    async def get(self, request):
+        try:
+            export_format = parse_export_format(request.GET.get('output'))
+            queryset = export_queryset(**parse_export_filters(request.GET))
+        except ValidationError as e:
+            return json_response(e.detail, status=400)
+        rows = queryset.using(queryset.db).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            astream_export(rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+            headers={'Content-Disposition': f'attachment; filename="deliveries.{export_format}"'}
+        )
+
+
+class AsyncDeliveryLocationView(View):
+    async def post(self, request, delivery_id):
+        try:
+            accept_location_ping(delivery_id, json.loads(request.body))
+        except ValueError as e:
+            return json_response({'detail': f'JSON parse error - {e}'}, status=400)
+        except ValidationError as e:
+            return json_response(e.detail, status=400)
+        return json_response({"message": "Location accepted"}, status=202)
+
+
+async def next_change(subscription, seen_etag, timeout):
+    """
+    Wait up to ``timeout`` seconds for an event whose ETag differs from
+    ``seen_etag``, polling the row while idle. Returns ``None`` on timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while (remaining := deadline - loop.time()) > 0:
+        try:
+            event = await asyncio.wait_for(subscription.queue.get(), min(remaining, delivery_updates.poll_interval))
+        except asyncio.TimeoutError:
+            await delivery_updates.poll(subscription.delivery_id)
+            continue
+        if event.etag != seen_etag:
+            return event
+    return None
+
+
+class AsyncDeliveryStreamView(View):
+    """
+    Live delivery tracking. Streams the delivery payload as server-sent
+    events whenever it changes, until it is delivered or cancelled. With
+    ``?wait=<seconds>`` it long-polls instead: it answers as soon as the
+    delivery differs from ``If-None-Match``, or with a 304 once ``wait`` runs out.
+    """
+    keepalive_interval = 15
+    max_wait = 60
+
+    async def get(self, request, delivery_id):
+        try:
+            delivery_id = int(delivery_id)
+        except ValueError:
+            return delivery_not_found()
+        if not await Delivery.objects.filter(pk=delivery_id).aexists():
+            return delivery_not_found()
+        if delivery_updates.at_capacity:
+            return self.too_many_subscribers()
+        if 'wait' not in request.GET:
+            response = StreamingHttpResponse(
+                self.stream(delivery_id, request.headers.get('Last-Event-ID')),
+                content_type='text/event-stream'
+            )
+            response['Cache-Control'] = 'no-cache'
+            # Stop nginx from buffering the stream.
+            response['X-Accel-Buffering'] = 'no'
+            return response
+
+        try:
+            wait = min(float(request.GET['wait']), self.max_wait)
+        except ValueError:
+            return json_response({'detail': 'wait must be a number of seconds.'}, status=400)
+        try:
+            subscription = delivery_updates.subscribe(delivery_id)
+        except TooManySubscribers:
+            return self.too_many_subscribers()
+        try:
+            current = await self.current(delivery_id)
+            response = not_modified(request, current.etag)
+            if response is None:
+                return self.delivery_response(current)
+            event = await next_change(subscription, current.etag, wait)
+            return response if event is None else self.delivery_response(event)
+        finally:
+            delivery_updates.unsubscribe(subscription)
+
+    def too_many_subscribers(self):
+        return json_response({'detail': 'Too many live connections, try again later.'}, status=503)
+
+    async def current(self, delivery_id):
+        # Read after subscribing, so that no change can fall in between.
+        return DeliveryEvent.from_delivery(await Delivery.objects.aget(pk=delivery_id))
+
+    def delivery_response(self, event):
+        return json_response(
+            {
+                "message": "Delivery information retrieved successfully",
+                "delivery": event.payload
+            },
+            headers={'ETag': event.etag}
+        )
+
+    async def stream(self, delivery_id, last_event_id):
+        # Subscribing here rather than in get() ties the subscription to the
+        # generator, which is closed when the client goes away.
+        try:
+            subscription = delivery_updates.subscribe(delivery_id)
+        except TooManySubscribers:
+            # Filled up since get() checked; the client reconnects.
+            return
+        try:
+            current = await self.current(delivery_id)
+            # A reconnecting client that already has this version is not sent it again.
+            if current.etag != last_event_id:
+                yield current.data
+            while not current.final:
+                event = await next_change(subscription, current.etag, self.keepalive_interval)
+                if event is None:
+                    yield b': keepalive\n\n'
+                    continue
+                current = event
+                yield current.data
+        finally:
+            delivery_updates.unsubscribe(subscription)
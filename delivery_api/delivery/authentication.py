@@ -0,0 +1,38 @@
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from .cache import DjangoCache, LRUCache
+
+
+def token_cache_from_settings():
+    options = settings.API_TOKEN_CACHE
+    if options.get('ALIAS'):
+        return DjangoCache(options['ALIAS'], timeout=options['TIMEOUT'])
+    return LRUCache(max_entries=options['MAX_ENTRIES'], timeout=options['TIMEOUT'])
+
+
+token_cache = token_cache_from_settings()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    ``TokenAuthentication`` that remembers valid tokens for
+    ``API_TOKEN_CACHE['TIMEOUT']`` seconds, so a polling client costs one
+    token lookup per timeout instead of one per request.
+
+    Deleting a token evicts it from the cache of the process that deleted
+    it, or from every process when ``API_TOKEN_CACHE['ALIAS']`` names a
+    shared cache; otherwise other processes keep accepting it until their
+    entry expires. Deactivating its user always takes effect on expiry.
+    """
+
+    def authenticate_credentials(self, key):
+        credentials = token_cache.get(key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            token_cache.set(key, credentials)
+        return credentials
+
+
+def forget_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key)
@@ -0,0 +1,117 @@
+from functools import partial
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .cache import delivery_cache
+from .eta import assign_etas
+from .geo import assign_geohashes
+from .live import delivery_updates
+from .models import Delivery, OutboxEvent
+from .outbox import status_changed_event
+from .serializers import DeliverySerializer
+from .transitions import can_transition
+
+BULK_CHUNK_SIZE = 500
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def bulk_create_deliveries(deliveries, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Insert unsaved ``Delivery`` instances, one transaction per chunk.
+
+    ``bulk_create`` skips ``Delivery.save()``, so the ETA and geohash are filled in here.
+    Returns the created instances with their primary keys set.
+    """
+    created = []
+    for chunk in chunked(deliveries, chunk_size):
+        assign_etas(chunk)
+        assign_geohashes(chunk)
+        with transaction.atomic():
+            created += Delivery.objects.bulk_create(chunk)
+    return created
+
+
+def import_deliveries(items, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Validate ``items`` with ``DeliverySerializer`` and insert the valid ones.
+
+    Returns one result per item, in order, holding either the new
+    ``delivery_id`` or the validation ``errors``, and the number created.
+    """
+    results = []
+    valid = []
+    for index, item in enumerate(items):
+        serializer = DeliverySerializer(data=item)
+        if serializer.is_valid():
+            valid.append((index, Delivery(**serializer.validated_data)))
+            results.append(None)
+        else:
+            results.append({'index': index, 'errors': serializer.errors})
+
+    created = bulk_create_deliveries([delivery for _, delivery in valid], chunk_size)
+    for (index, _), delivery in zip(valid, created):
+        results[index] = {'index': index, 'delivery_id': delivery.id}
+    return results, len(created)
+
+
+def bulk_update_status(updates, chunk_size=BULK_CHUNK_SIZE):
+    """
+    Apply ``{delivery_id: status}``, one transaction per chunk, with one
+    ``UPDATE ... WHERE id IN (...) AND status = ?`` per pair of current and
+    new status. Transitions that ``TRANSITIONS`` does not allow are skipped.
+    Outbox events for the rows that changed are written in the same
+    transaction.
+
+    Returns the set of ids now in the requested status, and the current
+    status of every delivery whose transition was refused.
+    """
+    updated = set()
+    conflicts = {}
+    for chunk in chunked(updates.items(), chunk_size):
+        now = timezone.now()
+        with transaction.atomic():
+            existing = {
+                pk: (order_id, status) for pk, order_id, status in
+                Delivery.objects.select_for_update()
+                .filter(id__in=[pk for pk, _ in chunk]).values_list('id', 'order_id', 'status')
+            }
+            moves = {}
+            for pk, new_status in chunk:
+                if pk not in existing:
+                    continue
+                current_status = existing[pk][1]
+                if current_status == new_status:
+                    updated.add(pk)
+                elif can_transition(current_status, new_status):
+                    moves.setdefault((current_status, new_status), []).append(pk)
+                else:
+                    conflicts[pk] = current_status
+
+            changed = []
+            for (current_status, new_status), ids in moves.items():
+                count = Delivery.objects.filter(id__in=ids, status=current_status).update(
+                    status=new_status, updated_at=now
+                )
+                if count < len(ids):
+                    # Without row locks (SQLite) another writer may have moved some of them first.
+                    ids = list(Delivery.objects.filter(id__in=ids, status=new_status, updated_at=now)
+                               .values_list('id', flat=True))
+                    lost = [pk for pk in moves[current_status, new_status] if pk not in ids]
+                    conflicts.update(Delivery.objects.filter(id__in=lost).values_list('id', 'status'))
+                changed += [(pk, current_status, new_status) for pk in ids]
+            OutboxEvent.objects.bulk_create([
+                status_changed_event(pk, existing[pk][0], current_status, new_status, now)
+                for pk, current_status, new_status in changed
+            ])
+            changed_ids = [pk for pk, _, _ in changed]
+            delivery_cache.invalidate_many(changed_ids)
+            transaction.on_commit(partial(delivery_updates.publish_ids, changed_ids))
+        updated.update(changed_ids)
+    return updated, conflicts
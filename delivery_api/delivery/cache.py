@@ -0,0 +1,227 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .metrics import registry
+
+
+class LRUCache:
+    """Thread-safe in-process cache with a per-entry TTL and LRU eviction."""
+
+    def __init__(self, max_entries=10000, timeout=30):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.timeout)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_many(self, keys):
+        return {key: value for key in keys if (value := self.get(key)) is not None}
+
+    def set_many(self, entries):
+        for key, value in entries.items():
+            self.set(key, value)
+
+    # Lookups never block, so the async API simply calls the sync one.
+    async def aget(self, key):
+        return self.get(key)
+
+    async def aset(self, key, value):
+        self.set(key, value)
+
+    async def aget_many(self, keys):
+        return self.get_many(keys)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def size(self):
+        return len(self._data)
+
+
+class DjangoCache:
+    """
+    Adapter that stores entries in one of the ``CACHES`` aliases, so that
+    every process sees the same entries and invalidations. Give it a
+    dedicated alias: ``clear()`` clears the whole alias.
+    """
+
+    # Django cache backends report neither evictions nor their size.
+    evictions = None
+    size = None
+
+    def __init__(self, alias, timeout=30):
+        self.cache = caches[alias]
+        self.timeout = timeout
+
+    def get(self, key):
+        return self.cache.get(key)
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def delete(self, key):
+        self.cache.delete(key)
+
+    def get_many(self, keys):
+        return self.cache.get_many(keys)
+
+    def set_many(self, entries):
+        self.cache.set_many(entries, self.timeout)
+
+    async def aget(self, key):
+        return await self.cache.aget(key)
+
+    async def aset(self, key, value):
+        await self.cache.aset(key, value, self.timeout)
+
+    async def aget_many(self, keys):
+        return await self.cache.aget_many(keys)
+
+    def clear(self):
+        self.cache.clear()
+
+
+class DeliveryCache:
+    """
+    Read-through cache of delivery detail payloads keyed by delivery id.
+
+    Each delivery has a version token next to its entry. Readers take the
+    token with ``version()`` before loading the row and store it with the
+    payload; writes replace the token both immediately and once the
+    surrounding transaction commits. An entry whose token is no longer
+    current is a miss, so a read that raced a write and cached the old row
+    is never served.
+    """
+
+    key_prefix = 'delivery:'
+    version_prefix = 'delivery-version:'
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.DELIVERY_CACHE
+        if options.get('ALIAS'):
+            return cls(DjangoCache(options['ALIAS'], timeout=options['TIMEOUT']))
+        return cls(LRUCache(max_entries=options['MAX_ENTRIES'], timeout=options['TIMEOUT']))
+
+    def make_key(self, delivery_id):
+        return f'{self.key_prefix}{delivery_id}'
+
+    def make_version_key(self, delivery_id):
+        return f'{self.version_prefix}{delivery_id}'
+
+    def current(self, delivery_id, found):
+        entry = found.get(self.make_key(delivery_id))
+        if entry is None:
+            value = None
+        else:
+            version, value = entry
+            if version != found.get(self.make_version_key(delivery_id)):
+                value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def get(self, delivery_id):
+        keys = [self.make_key(delivery_id), self.make_version_key(delivery_id)]
+        return self.current(delivery_id, self.backend.get_many(keys))
+
+    async def aget(self, delivery_id):
+        keys = [self.make_key(delivery_id), self.make_version_key(delivery_id)]
+        return self.current(delivery_id, await self.backend.aget_many(keys))
+
+    def version(self, delivery_id):
+        """Token to pass to ``set()`` for a row loaded after this call."""
+        key = self.make_version_key(delivery_id)
+        version = self.backend.get(key)
+        if version is None:
+            # Tokens are never reused, so an expired or evicted one cannot revive an old entry.
+            version = uuid.uuid4().hex
+            self.backend.set(key, version)
+        return version
+
+    async def aversion(self, delivery_id):
+        key = self.make_version_key(delivery_id)
+        version = await self.backend.aget(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            await self.backend.aset(key, version)
+        return version
+
+    def set(self, delivery_id, value, version):
+        self.backend.set(self.make_key(delivery_id), (version, value))
+
+    async def aset(self, delivery_id, value, version):
+        await self.backend.aset(self.make_key(delivery_id), (version, value))
+
+    def invalidate(self, delivery_id):
+        self.invalidate_many([delivery_id])
+
+    def invalidate_many(self, delivery_ids):
+        keys = [self.make_version_key(delivery_id) for delivery_id in delivery_ids]
+
+        def replace_versions():
+            self.backend.set_many({key: uuid.uuid4().hex for key in keys})
+
+        replace_versions()
+        transaction.on_commit(replace_versions)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.backend.evictions,
+            'size': self.backend.size,
+        }
+
+
+delivery_cache = DeliveryCache.from_settings()
+
+registry.gauge('delivery_cache_hits_total', 'Delivery cache hits.', lambda: delivery_cache.hits, type='counter')
+registry.gauge('delivery_cache_misses_total', 'Delivery cache misses.', lambda: delivery_cache.misses, type='counter')
+registry.gauge(
+    'delivery_cache_evictions_total', 'Delivery cache LRU evictions.',
+    lambda: delivery_cache.backend.evictions, type='counter'
+)
+registry.gauge('delivery_cache_entries', 'Entries in the delivery cache.', lambda: delivery_cache.backend.size)
@@ -0,0 +1,41 @@
+import hashlib
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+
+
+def delivery_etag(delivery):
+    # updated_at changes on every save and bulk update, so it versions the row.
+    return quote_etag(f'{delivery.pk}-{delivery.updated_at.timestamp():.6f}')
+
+
+def summary_etag(*parts):
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return quote_etag(digest)
+
+
+LIST_SUMMARY = {'count': Count('id'), 'latest': Max('updated_at')}
+
+
+def queryset_etag(queryset, variant=''):
+    """
+    ETag for a list of deliveries, built from one aggregate query instead of
+    the rows themselves. ``variant`` distinguishes representations of the
+    same rows, e.g. different pages or projections.
+    """
+    summary = queryset.aggregate(**LIST_SUMMARY)
+    return summary_etag(summary['count'], summary['latest'], variant)
+
+
+async def aqueryset_etag(queryset, variant=''):
+    summary = await queryset.aaggregate(**LIST_SUMMARY)
+    return summary_etag(summary['count'], summary['latest'], variant)
+
+
+def not_modified(request, etag):
+    """Return a 304 response if the request's ``If-None-Match`` matches ``etag``, else ``None``."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response['ETag'] = etag
+    return response
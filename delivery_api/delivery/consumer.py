@@ -0,0 +1,409 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from urllib.parse import urlparse
+
+import pika
+from decouple import config
+from django.db import DatabaseError, DataError, IntegrityError, InterfaceError, OperationalError, transaction
+from django.db import connection as db_connection
+
+from .cache import LRUCache
+from .decoders import InvalidMessage, get_decoder
+from .eta import assign_etas
+from .metrics import registry
+from .models import Delivery
+
+logger = logging.getLogger(__name__)
+
+MESSAGES = registry.counter(
+    'delivery_consumer_messages_total',
+    'Order messages by outcome: ingested, duplicate, dead_lettered or rejected.', ['outcome']
+)
+REDELIVERED = registry.counter('delivery_consumer_redelivered_total', 'Messages the broker flagged as redelivered.')
+RECONNECTS = registry.counter('delivery_consumer_reconnects_total', 'Broker connections lost by consumer workers.')
+# decode covers schema validation as well, the decoders do both in one pass.
+STAGE_SECONDS = registry.histogram(
+    'delivery_consumer_stage_duration_seconds',
+    'Time per processing stage: decode and dedupe per message, db_write and ack per call.', ['stage']
+)
+BATCH_SIZE = registry.histogram(
+    'delivery_consumer_batch_size', 'Deliveries written per bulk insert.',
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
+LAG_SECONDS = registry.histogram(
+    'delivery_consumer_lag_seconds', 'Time from the producer timestamp to the message being received.',
+    buckets=(0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+)
+# Failures of the database rather than of the rows: "database is locked", a
+# failover or a dropped connection. The window is requeued, never rejected.
+TRANSIENT_DB_ERRORS = (OperationalError, InterfaceError)
+
+
+def consumer_stats():
+    """Snapshot of the consumer metrics for the periodic stats log line."""
+    stage_ms = {
+        stage: round(total / count * 1000, 3)
+        for (stage,), (count, total) in STAGE_SECONDS.totals().items() if count
+    }
+    batches = BATCH_SIZE.totals().get((), (0, 0))
+    return {
+        'messages': {outcome: count for (outcome,), count in MESSAGES.values().items()},
+        'redelivered': REDELIVERED.value(),
+        'reconnects': RECONNECTS.value(),
+        'mean_stage_ms': stage_ms,
+        'mean_batch_size': round(batches[1] / batches[0], 1) if batches[0] else 0,
+    }
+
+
+def get_connection_parameters():
+    parsed_url = urlparse(config('CLOUDAMQP_URL'))
+    return pika.ConnectionParameters(
+        host=parsed_url.hostname,
+        port=parsed_url.port or 5672,
+        virtual_host=parsed_url.path[1:] or '/',
+        credentials=pika.PlainCredentials(parsed_url.username, parsed_url.password),
+        heartbeat=config('AMQP_HEARTBEAT', default=60, cast=int),
+        blocked_connection_timeout=config('AMQP_BLOCKED_CONNECTION_TIMEOUT', default=300, cast=int)
+    )
+
+
+def connect():
+    return pika.BlockingConnection(get_connection_parameters())
+
+
+def message_idempotency_key(properties, body, explicit_key=None):
+    """
+    Prefer an explicit key from the producer, then the AMQP message id, and
+    fall back to a digest of the body, which is identical on redelivery.
+    """
+    key = explicit_key or getattr(properties, 'message_id', None)
+    if key is None:
+        return hashlib.sha256(body).hexdigest()
+    key = str(key)
+    return key if len(key) <= 64 else hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+_default_decoder = None
+
+
+def default_decoder():
+    global _default_decoder
+    if _default_decoder is None:
+        _default_decoder = get_decoder()
+    return _default_decoder
+
+
+def parse_order_message(body, properties=None, decoder=None):
+    order = (decoder or default_decoder()).decode(body)
+    return Delivery(
+        order_id=order.id,
+        payment_method=order.payment_method,
+        status=order.status,
+        current_location=order.address,
+        delivery_method=order.delivery_method,
+        idempotency_key=message_idempotency_key(properties, body, order.idempotency_key)
+    )
+
+
+def recent_keys_cache(max_entries=100000):
+    return LRUCache(max_entries=max_entries, timeout=24 * 3600)
+
+
+class BatchConsumer:
+    """
+    Buffers decoded messages and writes them with one bulk_create per window.
+
+    A window is flushed once it holds ``batch_size`` deliveries or once
+    ``flush_interval`` seconds have passed since its first message, and is
+    then acknowledged with a single ``basic_ack(multiple=True)``.
+    """
+
+    # Upper bound on how long the consume loop blocks, i.e. how quickly it notices stop_event.
+    poll_interval = 1.0
+
+    def __init__(self, channel, queue, batch_size=100, flush_interval=1.0, prefetch_count=None, stop_event=None,
+                 recent_keys=None, decoder=None, dead_letter_queue=None):
+        self.channel = channel
+        self.queue = queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.prefetch_count = prefetch_count or batch_size
+        self.stop_event = stop_event
+        self.decoder = decoder or default_decoder()
+        self.dead_letter_queue = dead_letter_queue
+        self.decode_failures = 0
+        # Keys of recently committed deliveries, so most redeliveries are dropped without a database round-trip.
+        self.recent_keys = recent_keys if recent_keys is not None else recent_keys_cache()
+        self.pending = []
+        self.pending_keys = set()
+        self.deadline = None
+        self.last_heartbeat = time.monotonic()
+        self.last_flush = None
+
+    def run(self):
+        """
+        Consume until ``stop_event`` is set, then flush and ack the open window
+        and hand any prefetched but unprocessed messages back to the broker.
+
+        If the connection drops instead, the open window is left unacknowledged
+        so the broker redelivers it. If the database is unavailable the window
+        is requeued and the error raised, for the worker to back off.
+        """
+        self.channel.basic_qos(prefetch_count=self.prefetch_count)
+        messages = self.channel.consume(self.queue, inactivity_timeout=min(self.flush_interval, self.poll_interval))
+        for method, properties, body in messages:
+            self.last_heartbeat = time.monotonic()
+            if method is not None:
+                self.handle(method, properties, body)
+            if self.pending and (len(self.pending) >= self.batch_size or time.monotonic() >= self.deadline):
+                self.flush()
+            if self.stop_event is not None and self.stop_event.is_set():
+                break
+        self.flush()
+        self.channel.cancel()
+
+    def handle(self, method, properties, body):
+        if getattr(method, 'redelivered', False):
+            REDELIVERED.inc()
+        timestamp = getattr(properties, 'timestamp', None)
+        if timestamp:
+            LAG_SECONDS.observe(max(time.time() - timestamp, 0))
+
+        started = time.perf_counter()
+        try:
+            delivery = parse_order_message(body, properties, self.decoder)
+        except InvalidMessage as e:
+            self.dead_letter(method, properties, body, e)
+            return
+        decoded = time.perf_counter()
+        STAGE_SECONDS.observe(decoded - started, 'decode')
+        key = delivery.idempotency_key
+        duplicate = key in self.pending_keys or self.recent_keys.get(key) is not None
+        STAGE_SECONDS.observe(time.perf_counter() - decoded, 'dedupe')
+        if duplicate:
+            logger.info('Skipping already ingested message %s', key)
+            MESSAGES.inc('duplicate')
+            self.ack(method.delivery_tag)
+            return
+        if not self.pending:
+            self.deadline = time.monotonic() + self.flush_interval
+        self.pending.append((method.delivery_tag, delivery))
+        self.pending_keys.add(key)
+
+    def dead_letter(self, method, properties, body, error):
+        """
+        Route an undecodable message to ``dead_letter_queue``, or reject it so
+        that the broker dead-letters it if the queue has a DLX configured.
+        """
+        self.decode_failures += 1
+        MESSAGES.inc('dead_lettered')
+        logger.warning('Dead-lettering undecodable message %s: %s', method.delivery_tag, error)
+        if self.dead_letter_queue is None:
+            self.channel.basic_reject(delivery_tag=method.delivery_tag, requeue=False)
+            return
+        headers = dict(getattr(properties, 'headers', None) or {})
+        headers['x-decode-error'] = str(error)[:512]
+        self.channel.basic_publish(
+            exchange='', routing_key=self.dead_letter_queue, body=body,
+            properties=pika.BasicProperties(headers=headers, delivery_mode=pika.DeliveryMode.Persistent)
+        )
+        self.ack(method.delivery_tag)
+
+    def ack(self, delivery_tag, multiple=False):
+        started = time.perf_counter()
+        self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
+        STAGE_SECONDS.observe(time.perf_counter() - started, 'ack')
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending, self.pending_keys = self.pending, [], set()
+        # bulk_create() bypasses Delivery.save(), so fill in the ETAs here.
+        assign_etas([delivery for _, delivery in pending])
+        started = time.perf_counter()
+        try:
+            with transaction.atomic():
+                # Rows whose key is already stored (a redelivery after a crash) are skipped by the database.
+                Delivery.objects.bulk_create([delivery for _, delivery in pending], ignore_conflicts=True)
+        except TRANSIENT_DB_ERRORS:
+            self.requeue(pending)
+            raise
+        except DatabaseError:
+            logger.exception('Bulk insert of %d deliveries failed, retrying one by one', len(pending))
+            self.flush_one_by_one(pending)
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - started, 'db_write')
+        BATCH_SIZE.observe(len(pending))
+        self.ack(pending[-1][0], multiple=True)
+        self.last_flush = time.monotonic()
+        MESSAGES.inc('ingested', amount=len(pending))
+        self.remember(pending)
+        logger.info('Ingested %d messages', len(pending))
+
+    def flush_one_by_one(self, pending):
+        """
+        Insert each delivery on its own so that only the rows the database
+        refuses are rejected. Any other error requeues what is left.
+        """
+        for index, (delivery_tag, delivery) in enumerate(pending):
+            try:
+                with transaction.atomic():
+                    Delivery.objects.bulk_create([delivery], ignore_conflicts=True)
+            except (IntegrityError, DataError) as e:
+                logger.warning('Rejecting message %s: %s', delivery_tag, e)
+                MESSAGES.inc('rejected')
+                self.channel.basic_reject(delivery_tag=delivery_tag, requeue=False)
+            except DatabaseError:
+                self.requeue(pending[index:])
+                raise
+            else:
+                self.ack(delivery_tag)
+                MESSAGES.inc('ingested')
+                self.remember([(delivery_tag, delivery)])
+
+    def requeue(self, pending):
+        # Everything before these tags is already settled, so one multiple nack covers exactly them.
+        logger.warning('Database unavailable, requeueing %d messages', len(pending))
+        self.channel.basic_nack(delivery_tag=pending[-1][0], multiple=True, requeue=True)
+
+    def remember(self, pending):
+        for _, delivery in pending:
+            self.recent_keys.set(delivery.idempotency_key, True)
+
+
+class ConsumerWorker(threading.Thread):
+    """
+    Runs a ``BatchConsumer`` on its own connection and channel, reconnecting
+    with exponential backoff whenever the connection to the broker is lost or
+    the database cannot take a write.
+    """
+
+    def __init__(self, name, queue, stop_event, connection_factory=connect, consumer_class=BatchConsumer,
+                 consumer_options=None, reconnect_delay=1.0, max_reconnect_delay=30.0):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue
+        self.stop_event = stop_event
+        self.connection_factory = connection_factory
+        self.consumer_class = consumer_class
+        self.consumer_options = consumer_options or {}
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.consumer = None
+        self.reconnects = 0
+        self.delay = reconnect_delay
+        self.database_delay = reconnect_delay
+
+    @property
+    def last_heartbeat(self):
+        return self.consumer.last_heartbeat if self.consumer is not None else None
+
+    def run(self):
+        self.delay = self.reconnect_delay
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    self.consume()
+                except pika.exceptions.AMQPError as e:
+                    self.reconnects += 1
+                    RECONNECTS.inc()
+                    logger.warning(
+                        '%s lost its broker connection (%s), reconnecting in %.1fs', self.name, e, self.delay
+                    )
+                    self.stop_event.wait(self.delay)
+                    self.delay = min(self.delay * 2, self.max_reconnect_delay)
+                except DatabaseError as e:
+                    # A worker that wrote before failing starts its backoff over.
+                    if self.consumer is not None and self.consumer.last_flush is not None:
+                        self.database_delay = self.reconnect_delay
+                    logger.warning('%s cannot write to the database (%s), retrying in %.1fs',
+                                   self.name, e, self.database_delay)
+                    db_connection.close()
+                    self.stop_event.wait(self.database_delay)
+                    self.database_delay = min(self.database_delay * 2, self.max_reconnect_delay)
+        finally:
+            db_connection.close()
+            logger.info('%s stopped', self.name)
+
+    def consume(self):
+        connection = self.connection_factory()
+        # Connected again, so the next loss starts the backoff from the beginning.
+        self.delay = self.reconnect_delay
+        try:
+            self.consumer = self.consumer_class(
+                connection.channel(), self.queue, stop_event=self.stop_event, **self.consumer_options
+            )
+            logger.info('%s consuming from %s', self.name, self.queue)
+            self.consumer.run()
+        finally:
+            if connection.is_open:
+                connection.close()
+
+
+class ConsumerPool:
+    """
+    Supervises ``workers`` consumer threads. Dead workers are replaced, and
+    workers whose consume loop has not ticked within ``stall_timeout`` seconds
+    are reported. ``stop()`` lets every worker drain its window before exiting.
+    """
+
+    def __init__(self, workers, queue, stall_timeout=60.0, stats_interval=None, **worker_options):
+        self.size = workers
+        self.queue = queue
+        self.stall_timeout = stall_timeout
+        self.stats_interval = stats_interval
+        self.worker_options = worker_options
+        # One set of recently seen keys for the whole pool, since any worker may get a redelivery.
+        consumer_options = worker_options.setdefault('consumer_options', {})
+        consumer_options.setdefault('recent_keys', recent_keys_cache())
+        self.stop_event = threading.Event()
+        self.workers = []
+
+    def start_worker(self, index):
+        worker = ConsumerWorker(f'consumer-{index}', self.queue, self.stop_event, **self.worker_options)
+        worker.start()
+        return worker
+
+    def start(self):
+        self.workers = [self.start_worker(index) for index in range(self.size)]
+
+    def check(self):
+        now = time.monotonic()
+        for index, worker in enumerate(self.workers):
+            if not worker.is_alive():
+                logger.error('%s died, starting a replacement', worker.name)
+                self.workers[index] = self.start_worker(index)
+            elif worker.last_heartbeat is not None and now - worker.last_heartbeat > self.stall_timeout:
+                logger.warning('%s has not polled the broker for %.0fs', worker.name, now - worker.last_heartbeat)
+
+    def log_stats(self, elapsed):
+        stats = consumer_stats()
+        ingested = stats['messages'].get('ingested', 0)
+        stats['ingested_per_second'] = round((ingested - self.last_ingested) / elapsed, 1)
+        self.last_ingested = ingested
+        logger.info('consumer stats %s', json.dumps(stats, sort_keys=True))
+
+    def run(self, check_interval=5.0):
+        """
+        Start the workers and supervise them until ``stop()``. Every
+        ``stats_interval`` seconds a JSON line of consumer metrics is logged.
+        """
+        self.start()
+        self.last_ingested = consumer_stats()['messages'].get('ingested', 0)
+        last_log = time.monotonic()
+        while not self.stop_event.wait(check_interval):
+            self.check()
+            now = time.monotonic()
+            if self.stats_interval and now - last_log >= self.stats_interval:
+                self.log_stats(now - last_log)
+                last_log = now
+        self.join()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def join(self, timeout=None):
+        for worker in self.workers:
+            worker.join(timeout)
@@ -0,0 +1,125 @@
+import json
+from typing import Literal, NamedTuple, Optional, Union
+
+from django.conf import settings
+
+from .models import Delivery
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional speed-up
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+
+class InvalidMessage(ValueError):
+    pass
+
+
+class OrderMessage(NamedTuple):
+    id: int
+    payment_method: str
+    status: str
+    address: Optional[str]
+    delivery_method: str
+    idempotency_key: Optional[str] = None
+
+
+def field_choices(name):
+    return tuple(value for value, _ in Delivery._meta.get_field(name).choices)
+
+
+CHOICE_FIELDS = ('payment_method', 'status', 'delivery_method')
+
+
+class JSONOrderDecoder:
+    """
+    Decodes with ``json`` (or ``orjson``) and validates ``order_data`` against
+    choice sets built once from the ``Delivery`` model.
+    """
+
+    def __init__(self, loads=json.loads, name='json'):
+        self.loads = loads
+        self.name = name
+        self.choices = {field: frozenset(field_choices(field)) for field in CHOICE_FIELDS}
+
+    def decode(self, body):
+        try:
+            data = self.loads(body)[0][0]['order_data']
+            order_id = data['id']
+            # Match msgspec: 12.0 is accepted, 12.7 and booleans are not (int() would truncate 12.7).
+            if isinstance(order_id, bool) or (isinstance(order_id, float) and not order_id.is_integer()):
+                raise TypeError('id must be an integer')
+            message = OrderMessage(
+                id=int(order_id),
+                payment_method=data['payment_method'],
+                status=data['status'],
+                address=data['address'],
+                delivery_method=data['delivery_method'],
+                idempotency_key=data.get('idempotency_key'),
+            )
+            if message.idempotency_key is not None:
+                message = message._replace(idempotency_key=str(message.idempotency_key))
+        except (ValueError, LookupError, TypeError, AttributeError) as e:
+            raise InvalidMessage(f'{type(e).__name__}: {e}') from e
+        for field, allowed in self.choices.items():
+            value = getattr(message, field)
+            # Check the type first: a list or dict is unhashable and would raise TypeError from ``in``.
+            if not isinstance(value, str) or value not in allowed:
+                raise InvalidMessage(f'Invalid {field}: {value!r}')
+        if message.address is not None and not isinstance(message.address, str):
+            raise InvalidMessage('address must be a string')
+        return message
+
+
+class MsgspecOrderDecoder:
+    """
+    Decodes and validates in one pass into a ``msgspec.Struct`` whose choice
+    fields are ``Literal`` types, so no intermediate dicts are built.
+    """
+
+    name = 'msgspec'
+
+    def __init__(self):
+        order_data = msgspec.defstruct('OrderData', [
+            ('id', int),
+            ('payment_method', Literal[field_choices('payment_method')]),
+            ('status', Literal[field_choices('status')]),
+            ('address', Optional[str]),
+            ('delivery_method', Literal[field_choices('delivery_method')]),
+            ('idempotency_key', Union[str, int, None], None),
+        ])
+        envelope = msgspec.defstruct('OrderEnvelope', [('order_data', order_data)])
+        # Only message[0][0] is an order; whatever else the producer sends is left undecoded.
+        self.outer = msgspec.json.Decoder(list[list[msgspec.Raw]])
+        self.envelope = msgspec.json.Decoder(envelope, strict=False)
+
+    def decode(self, body):
+        try:
+            data = self.envelope.decode(self.outer.decode(body)[0][0]).order_data
+        except (msgspec.ValidationError, msgspec.DecodeError, IndexError) as e:
+            raise InvalidMessage(str(e)) from e
+        key = data.idempotency_key
+        return OrderMessage(data.id, data.payment_method, data.status, data.address, data.delivery_method,
+                            None if key is None else str(key))
+
+
+def get_decoder(backend=None):
+    """
+    Return a decoder for ``backend`` ('msgspec', 'orjson' or 'json'), or the
+    fastest installed one for 'auto'.
+    """
+    backend = backend or settings.ORDER_MESSAGE_DECODER
+    if backend == 'auto':
+        backend = 'msgspec' if msgspec else 'orjson' if orjson else 'json'
+    if backend == 'msgspec' and msgspec:
+        return MsgspecOrderDecoder()
+    if backend == 'orjson' and orjson:
+        return JSONOrderDecoder(orjson.loads, name='orjson')
+    if backend == 'json':
+        return JSONOrderDecoder()
+    raise ValueError(f'Order message decoder {backend!r} is not available')
@@ -0,0 +1,57 @@
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, DateTimeField, F, Max, Min, Value, When
+from django.db.models.functions import Now
+from django.utils import timezone
+
+from .cache import delivery_cache
+
+# How long each delivery method takes, counted from when the delivery was created.
+ETA_OFFSETS = {
+    'standard': timedelta(days=5),
+    'express': timedelta(days=2),
+    'overnight': timedelta(days=1),
+}
+
+
+def estimate(delivery_method, start):
+    offset = ETA_OFFSETS.get(delivery_method)
+    return start + offset if offset is not None else None
+
+
+def assign_etas(deliveries, now=None):
+    """Set ``estimated_delivery_time`` on a batch of (possibly unsaved) deliveries."""
+    now = now or timezone.now()
+    for delivery in deliveries:
+        delivery.estimated_delivery_time = estimate(delivery.delivery_method, delivery.created_at or now)
+    return deliveries
+
+
+def eta_expression(start=F('created_at')):
+    """Database-side equivalent of ``estimate()`` for use in ``update()`` and ``annotate()``."""
+    return Case(
+        *[When(delivery_method=method, then=start + Value(offset)) for method, offset in ETA_OFFSETS.items()],
+        default=Value(None),
+        output_field=DateTimeField(),
+    )
+
+
+def recompute_etas(queryset, chunk_size=10000):
+    """
+    Rewrite the ETA of every row in ``queryset`` with one ``UPDATE`` per
+    ``chunk_size`` wide primary-key range. ``updated_at`` is bumped too, as
+    it versions the ETags, and the rows are dropped from the delivery cache.
+    Returns the number of rows updated.
+    """
+    bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+    updated = 0
+    for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+        chunk = queryset.filter(id__gte=start, id__lt=start + chunk_size)
+        with transaction.atomic():
+            ids = list(chunk.values_list('id', flat=True))
+            updated += chunk.update(estimated_delivery_time=eta_expression(), updated_at=Now())
+            delivery_cache.invalidate_many(ids)
+    return updated
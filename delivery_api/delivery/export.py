@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+from datetime import datetime, time
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from .bulk import chunked
+from .models import Delivery
+
+EXPORT_FIELDS = [
+    'id', 'order_id', 'payment_method', 'status', 'current_location', 'latitude', 'longitude',
+    'estimated_delivery_time', 'delivery_method', 'created_at', 'updated_at',
+]
+DATETIME_COLUMNS = [EXPORT_FIELDS.index(field) for field in ('estimated_delivery_time', 'created_at', 'updated_at')]
+EXPORT_CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+STATUSES = {value for value, _ in Delivery._meta.get_field('status').choices}
+
+# Rows fetched per database round trip, and rows rendered into each chunk sent to the client.
+EXPORT_CHUNK_SIZE = 2000
+RENDER_BATCH_SIZE = 500
+
+
+def parse_moment(value, name):
+    try:
+        moment = parse_datetime(value)
+        day = parse_date(value) if moment is None else None
+    except ValueError:  # Well formed, but not a real date, e.g. 2024-13-01.
+        moment = day = None
+    if moment is None:
+        if day is None:
+            raise ValidationError({name: 'Expected an ISO 8601 date or datetime.'})
+        moment = datetime.combine(day, time.min)
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def parse_export_format(value):
+    value = value or 'ndjson'
+    if value not in EXPORT_CONTENT_TYPES:
+        raise ValidationError({'output': f"Expected one of: {', '.join(EXPORT_CONTENT_TYPES)}"})
+    return value
+
+
+def parse_export_filters(params):
+    """
+    Validate the ``status`` (comma separated), ``updated_since`` and
+    ``updated_before`` filters in ``params``, as keyword arguments for
+    ``export_queryset``.
+    """
+    filters = {}
+    if params.get('status'):
+        statuses = [value.strip() for value in params['status'].split(',') if value.strip()]
+        unknown = [value for value in statuses if value not in STATUSES]
+        if unknown:
+            raise ValidationError({'status': f"Unknown status(es): {', '.join(unknown)}"})
+        filters['statuses'] = statuses
+    for name in ('updated_since', 'updated_before'):
+        if params.get(name):
+            filters[name] = parse_moment(params[name], name)
+    return filters
+
+
+def export_queryset(statuses=None, updated_since=None, updated_before=None):
+    """
+    Deliveries to export as tuples of ``EXPORT_FIELDS`` in id order. Iterate
+    with ``.iterator(chunk_size)`` so rows are fetched in chunks (a
+    server-side cursor on PostgreSQL) and never held in memory all at once.
+    """
+    queryset = Delivery.objects.all()
+    if statuses:
+        queryset = queryset.filter(status__in=statuses)
+    if updated_since:
+        queryset = queryset.filter(updated_at__gte=updated_since)
+    if updated_before:
+        queryset = queryset.filter(updated_at__lt=updated_before)
+    return queryset.order_by('id').values_list(*EXPORT_FIELDS)
+
+
+def isoformat_dates(row):
+    row = list(row)
+    for index in DATETIME_COLUMNS:
+        if row[index] is not None:
+            row[index] = row[index].isoformat()
+    return row
+
+
+def write_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode('utf-8')
+
+
+def render_csv(rows):
+    return write_csv(isoformat_dates(row) for row in rows)
+
+
+def render_ndjson(rows):
+    return ''.join(
+        json.dumps(dict(zip(EXPORT_FIELDS, isoformat_dates(row)))) + '\n' for row in rows
+    ).encode('utf-8')
+
+
+def export_header(export_format):
+    return write_csv([EXPORT_FIELDS]) if export_format == 'csv' else b''
+
+
+RENDERERS = {'csv': render_csv, 'ndjson': render_ndjson}
+
+
+def stream_export(rows, export_format, batch_size=RENDER_BATCH_SIZE):
+    """Render the tuples in ``rows`` as ``export_format`` bytes, ``batch_size`` rows per chunk."""
+    render = RENDERERS[export_format]
+    yield export_header(export_format)
+    for batch in chunked(rows, batch_size):
+        yield render(batch)
+
+
+async def astream_export(rows, export_format, batch_size=RENDER_BATCH_SIZE):
+    """
+    ``stream_export`` for ASGI. Each batch is fetched from ``rows`` and
+    rendered in a worker thread, off the event loop. (``aiterator()`` cannot
+    be used: in Django 5.0 it runs ``values_list()`` queries on the loop.)
+    """
+    render = RENDERERS[export_format]
+
+    @sync_to_async
+    def next_chunk():
+        batch = list(islice(rows, batch_size))
+        return render(batch) if batch else None
+
+    yield export_header(export_format)
+    while (chunk := await next_chunk()) is not None:
+        yield chunk
@@ -0,0 +1,139 @@
+import math
+
+from django.db.models import Q
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - optional speed-up
+    numpy = None
+
+GEOHASH_ALPHABET = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Length of the stored geohashes: cells of about 5 x 5 metres.
+GEOHASH_PRECISION = 9
+EARTH_RADIUS = 6371008.8  # Metres.
+# Upper bound on the cells (and so index ranges) a nearby search looks in.
+MAX_COVERING_CELLS = 16
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash of a point: interleaved longitude and latitude bisections, 5 bits per character."""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = count = 0
+    is_lng = True
+    while len(chars) < precision:
+        bounds, value = (lng_range, longitude) if is_lng else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        is_lng = not is_lng
+        count += 1
+        if count == 5:
+            chars.append(GEOHASH_ALPHABET[bits])
+            bits = count = 0
+    return ''.join(chars)
+
+
+def geohash_of(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    return encode(latitude, longitude)
+
+
+def assign_geohashes(deliveries):
+    """Set ``geohash`` from the coordinates of a batch of (possibly unsaved) deliveries."""
+    for delivery in deliveries:
+        delivery.geohash = geohash_of(delivery.latitude, delivery.longitude)
+    return deliveries
+
+
+def cell_size(precision):
+    """Height and width in degrees of a geohash cell of ``precision`` characters."""
+    lat_bits = 5 * precision // 2
+    lng_bits = 5 * precision - lat_bits
+    return 180 / 2 ** lat_bits, 360 / 2 ** lng_bits
+
+
+def covering_cells(latitude, longitude, radius, max_cells=MAX_COVERING_CELLS):
+    """
+    Geohash prefixes that together contain every point within ``radius``
+    metres: the cells overlapping the circle's bounding box, at the longest
+    precision that needs at most ``max_cells`` of them. ``['']`` means
+    everything.
+    """
+    spread = math.degrees(radius / EARTH_RADIUS)
+    south, north = max(latitude - spread, -90.0), min(latitude + spread, 90.0)
+    cos_edge = math.cos(math.radians(max(abs(south), abs(north))))
+    lng_spread = spread / cos_edge if cos_edge > 1e-9 else 180.0
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        columns = round(360 / width)
+        first_row = int((south + 90) // height)
+        rows = range(first_row, min(int((north + 90) // height), round(180 / height) - 1) + 1)
+        if lng_spread >= 180:
+            cols = range(columns)
+        else:
+            first_col = int((longitude - lng_spread + 180) // width)
+            cols = range(first_col, int((longitude + lng_spread + 180) // width) + 1)
+        if len(rows) * min(len(cols), columns) > max_cells:
+            continue
+        return sorted({
+            encode(-90 + (row + 0.5) * height, -180 + (col % columns + 0.5) * width, precision)
+            for row in rows for col in cols
+        })
+    return ['']
+
+
+def next_prefix(prefix):
+    """The smallest geohash prefix sorting after every geohash starting with ``prefix``."""
+    while prefix and prefix[-1] == GEOHASH_ALPHABET[-1]:
+        prefix = prefix[:-1]
+    if not prefix:
+        return None
+    return prefix[:-1] + GEOHASH_ALPHABET[GEOHASH_ALPHABET.index(prefix[-1]) + 1]
+
+
+def geohash_filter(cells, **filters):
+    """
+    ``Q`` matching geohashes under any of ``cells``, as ``>= low AND < high``
+    ranges (adjacent ones merged) that a B-tree index answers on both SQLite
+    and PostgreSQL, unlike ``LIKE 'prefix%'``. ``filters`` are repeated in
+    every range, so an index on ``(status, geohash)`` serves each of them.
+    """
+    ranges = []
+    for cell in sorted(cells):
+        high = next_prefix(cell)
+        if ranges and ranges[-1][1] == cell:
+            ranges[-1][1] = high
+        else:
+            ranges.append([cell, high])
+    query = Q()
+    for low, high in ranges:
+        bounded = Q(geohash__gte=low, **filters)
+        if high is not None:
+            bounded &= Q(geohash__lt=high)
+        query |= bounded
+    return query
+
+
+def haversine(latitude, longitude, latitudes, longitudes):
+    """Great-circle distances in metres from one point to sequences of points, vectorised with numpy if present."""
+    if numpy is not None:
+        lat1, lng1 = numpy.radians(latitude), numpy.radians(longitude)
+        lat2 = numpy.radians(numpy.asarray(latitudes, dtype=float))
+        lng2 = numpy.radians(numpy.asarray(longitudes, dtype=float))
+        a = numpy.sin((lat2 - lat1) / 2) ** 2 + numpy.cos(lat1) * numpy.cos(lat2) * numpy.sin((lng2 - lng1) / 2) ** 2
+        return (2 * EARTH_RADIUS * numpy.arcsin(numpy.sqrt(numpy.minimum(a, 1.0)))).tolist()
+    lat1, lng1 = math.radians(latitude), math.radians(longitude)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for lat2, lng2 in zip(latitudes, longitudes):
+        lat2, lng2 = math.radians(lat2), math.radians(lng2)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS * math.asin(math.sqrt(min(a, 1.0))))
+    return distances
@@ -0,0 +1,208 @@
+import csv
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import NamedTuple
+
+import django
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import bulk_create_deliveries, chunked
+from .decoders import CHOICE_FIELDS, field_choices
+from .models import Delivery
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+IMPORT_CHUNK_SIZE = 2000
+COORDINATE_LIMITS = {'latitude': 90, 'longitude': 180}
+
+
+class RowValidator:
+    """
+    Checks imported rows against the ``Delivery`` field choices, defaults and
+    lengths, which are read from the model once. Far cheaper per row than a
+    ``DeliverySerializer``, which matters for files of millions of rows.
+    """
+
+    def __init__(self):
+        self.choices = {field: frozenset(field_choices(field)) for field in CHOICE_FIELDS}
+        self.defaults = {field: Delivery._meta.get_field(field).default for field in CHOICE_FIELDS}
+        self.location_length = Delivery._meta.get_field('current_location').max_length
+
+    def validate(self, data):
+        """Return ``(fields, None)`` for a valid row and ``(None, errors)`` otherwise."""
+        if not isinstance(data, dict):
+            return None, {'row': 'Expected an object.'}
+        errors = {}
+        fields = {}
+
+        order_id = data.get('order_id')
+        try:
+            if order_id is None or order_id == '' or isinstance(order_id, (bool, float)):
+                raise ValueError
+            fields['order_id'] = int(order_id)
+        except (TypeError, ValueError):
+            errors['order_id'] = 'A valid integer is required.'
+
+        for field, allowed in self.choices.items():
+            value = data.get(field) or self.defaults[field]
+            if isinstance(value, str) and value in allowed:
+                fields[field] = value
+            else:
+                errors[field] = f'"{value}" is not a valid choice.'
+
+        location = data.get('current_location') or None
+        if location is not None and not isinstance(location, str):
+            errors['current_location'] = 'Not a valid string.'
+        elif location is not None and len(location) > self.location_length:
+            errors['current_location'] = f'Ensure this field has no more than {self.location_length} characters.'
+        fields['current_location'] = location
+
+        coordinates = {}
+        for field, limit in COORDINATE_LIMITS.items():
+            value = data.get(field)
+            coordinates[field] = None if value is None or value == '' else value
+            if coordinates[field] is None:
+                continue
+            try:
+                if isinstance(value, bool):
+                    raise ValueError
+                coordinates[field] = float(value)
+            except (TypeError, ValueError):
+                errors[field] = 'A valid number is required.'
+                continue
+            if not -limit <= coordinates[field] <= limit:  # Also rejects nan.
+                errors[field] = f'Ensure this value is between -{limit} and {limit}.'
+        if (coordinates['latitude'] is None) != (coordinates['longitude'] is None):
+            errors.setdefault('latitude', 'Set latitude and longitude together.')
+        fields.update(coordinates)
+
+        created_at = data.get('created_at') or None
+        if created_at is not None:
+            try:
+                created_at = datetime.fromisoformat(created_at)
+            except (TypeError, ValueError):
+                errors['created_at'] = 'Expected an ISO 8601 datetime.'
+            else:
+                if timezone.is_naive(created_at):
+                    created_at = timezone.make_aware(created_at)
+        fields['created_at'] = created_at
+
+        return (None, errors) if errors else (fields, None)
+
+
+_validator = None
+
+
+def parse_chunk(import_format, items):
+    """
+    Decode and validate ``(line, raw)`` pairs. Returns the valid rows as
+    ``Delivery`` field dicts and the rejects as ``(line, raw, errors)``.
+    Runs in the parsing workers, so it only needs the model's metadata.
+    """
+    global _validator
+    if _validator is None:
+        _validator = RowValidator()
+    valid, rejects = [], []
+    for line, raw in items:
+        data = raw
+        if import_format == 'ndjson':
+            try:
+                data = json.loads(raw)
+            except ValueError as e:
+                rejects.append((line, raw, {'row': f'Invalid JSON: {e}'}))
+                continue
+        fields, errors = _validator.validate(data)
+        if errors:
+            rejects.append((line, raw, errors))
+        else:
+            valid.append(fields)
+    return valid, rejects
+
+
+def read_items(file, import_format):
+    """
+    Yield ``(line, raw)`` for every row of ``file`` without reading it all:
+    a dict per CSV record (``line`` is where the record ends), or the text
+    of each NDJSON line.
+    """
+    if import_format == 'csv':
+        # The csv module handles quoted fields spanning lines, so records are split here.
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+    else:
+        for line, text in enumerate(file, 1):
+            if text.strip():
+                yield line, text.rstrip('\r\n')
+
+
+def parse_chunks(chunks, import_format, workers):
+    """
+    ``parse_chunk`` every chunk, in order, in up to ``workers`` processes. At
+    most two chunks per worker are in flight, so memory use stays bounded.
+    """
+    if not workers:
+        for chunk in chunks:
+            yield parse_chunk(import_format, chunk)
+        return
+    with ProcessPoolExecutor(workers, initializer=django.setup) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(parse_chunk, import_format, chunk))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def insert_chunk(deliveries, now):
+    """
+    Insert one chunk, keeping the historical ``created_at`` of its rows.
+    ``auto_now_add`` stamps the insert time, so the original values are
+    written back in the same transaction with one bulk ``UPDATE``.
+    """
+    created_at = [delivery.created_at or now for delivery in deliveries]
+    for delivery, value in zip(deliveries, created_at):
+        delivery.created_at = value  # The ETAs count from it.
+    with transaction.atomic():
+        created = bulk_create_deliveries(deliveries, len(deliveries) or 1)
+        for delivery, value in zip(created, created_at):
+            delivery.created_at = value
+        Delivery.objects.bulk_update(created, ['created_at'])
+
+
+class ImportReport(NamedTuple):
+    rows: int
+    imported: int
+    rejected: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+def import_file(file, rejects, import_format, workers=0, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Stream deliveries from the open ``file`` into the database. Rows are
+    parsed and validated ``chunk_size`` at a time by ``workers`` processes
+    (in this process for 0), and every valid chunk is inserted with
+    ``bulk_create_deliveries``, which also fills in the ETAs. Rejected rows
+    are written to the ``rejects`` text file as NDJSON with their errors.
+    """
+    start = time.monotonic()
+    now = timezone.now()
+    rows = imported = rejected = 0
+    chunks = chunked(read_items(file, import_format), chunk_size)
+    for valid, invalid in parse_chunks(chunks, import_format, workers):
+        for line, raw, errors in invalid:
+            rejects.write(json.dumps({'line': line, 'errors': errors, 'row': raw}) + '\n')
+        if valid:
+            insert_chunk([Delivery(**fields) for fields in valid], now)
+        rows += len(valid) + len(invalid)
+        imported += len(valid)
+        rejected += len(invalid)
+    return ImportReport(rows, imported, rejected, time.monotonic() - start)
@@ -0,0 +1,171 @@
+import asyncio
+import json
+import threading
+import time
+from typing import NamedTuple
+
+from django.conf import settings
+from rest_framework.utils.encoders import JSONEncoder
+
+from .conditional import delivery_etag
+
+# Statuses after which a delivery no longer changes, so streams can end.
+TERMINAL_STATUSES = frozenset({'delivered', 'cancelled'})
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+class DeliveryEvent(NamedTuple):
+    etag: str
+    payload: dict
+    data: bytes
+
+    @classmethod
+    def from_delivery(cls, delivery):
+        # Imported here because models.py imports this module.
+        from .serializers import DeliveryResponseSerializer
+
+        etag = delivery_etag(delivery)
+        payload = dict(DeliveryResponseSerializer(delivery).data)
+        body = json.dumps(payload, cls=JSONEncoder)
+        return cls(etag, payload, f'id: {etag}\nevent: delivery\ndata: {body}\n\n'.encode('utf-8'))
+
+    @property
+    def final(self):
+        return self.payload['status'] in TERMINAL_STATUSES
+
+
+class Subscription:
+    """
+    One connection's view of a delivery. Events are snapshots of the whole
+    row, so when a slow client's queue is full the oldest one is dropped
+    instead of blocking the publisher or growing without bound.
+    """
+
+    def __init__(self, delivery_id, loop, max_queued):
+        self.delivery_id = delivery_id
+        self.loop = loop
+        self.queue = asyncio.Queue(max_queued)
+        self.dropped = 0
+
+    def offer(self, event):
+        # Runs on the subscriber's event loop.
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    def put(self, event):
+        self.loop.call_soon_threadsafe(self.offer, event)
+
+
+class Topic:
+    def __init__(self):
+        self.subscribers = set()
+        self.polled_at = 0.0
+
+
+class DeliveryUpdates:
+    """
+    In-process fan-out of delivery changes to streaming connections.
+
+    A change is serialised once into a ``DeliveryEvent`` and handed to every
+    subscriber of that delivery. Changes made by other processes (other
+    workers, the order consumer) never reach ``publish``, so streams also
+    ``poll`` the row, at most once per ``poll_interval`` per delivery.
+    """
+
+    def __init__(self, max_queued=8, max_subscribers=10000, poll_interval=5.0):
+        self.max_queued = max_queued
+        self.max_subscribers = max_subscribers
+        self.poll_interval = poll_interval
+        self.topics = {}
+        self.subscriber_count = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        options = settings.DELIVERY_STREAM
+        return cls(
+            max_queued=options['MAX_QUEUED'],
+            max_subscribers=options['MAX_SUBSCRIBERS'],
+            poll_interval=options['POLL_INTERVAL'],
+        )
+
+    @property
+    def at_capacity(self):
+        return self.subscriber_count >= self.max_subscribers
+
+    def subscribe(self, delivery_id):
+        """Subscribe the running event loop to changes of ``delivery_id``."""
+        subscription = Subscription(delivery_id, asyncio.get_running_loop(), self.max_queued)
+        with self._lock:
+            if self.at_capacity:
+                raise TooManySubscribers()
+            topic = self.topics.setdefault(delivery_id, Topic())
+            topic.subscribers.add(subscription)
+            # Whoever polls first waits a full interval; the caller has just read the row.
+            topic.polled_at = time.monotonic()
+            self.subscriber_count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            topic = self.topics.get(subscription.delivery_id)
+            if topic is None or subscription not in topic.subscribers:
+                return
+            topic.subscribers.discard(subscription)
+            self.subscriber_count -= 1
+            if not topic.subscribers:
+                del self.topics[subscription.delivery_id]
+
+    def has_subscribers(self, delivery_id):
+        return delivery_id in self.topics
+
+    def dispatch(self, delivery_id, event):
+        with self._lock:
+            topic = self.topics.get(delivery_id)
+            subscribers = list(topic.subscribers) if topic else []
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def publish(self, delivery):
+        """Push ``delivery``'s current state to its subscribers, if it has any."""
+        if self.has_subscribers(delivery.pk):
+            self.dispatch(delivery.pk, DeliveryEvent.from_delivery(delivery))
+
+    def publish_ids(self, delivery_ids):
+        """Re-read and publish the deliveries in ``delivery_ids`` that have subscribers, in one query."""
+        from .models import Delivery
+
+        watched = [delivery_id for delivery_id in delivery_ids if self.has_subscribers(delivery_id)]
+        if watched:
+            for delivery in Delivery.objects.filter(id__in=watched):
+                self.publish(delivery)
+
+    def claim_poll(self, delivery_id):
+        with self._lock:
+            topic = self.topics.get(delivery_id)
+            now = time.monotonic()
+            if topic is None or now - topic.polled_at < self.poll_interval:
+                return False
+            topic.polled_at = now
+            return True
+
+    async def poll(self, delivery_id):
+        """
+        Re-read the row if no subscriber of this delivery did so within the
+        last ``poll_interval``. Subscribers drop events they have already seen.
+        """
+        from .models import Delivery
+
+        if not self.claim_poll(delivery_id):
+            return
+        delivery = await Delivery.objects.filter(pk=delivery_id).afirst()
+        if delivery is not None:
+            self.dispatch(delivery_id, DeliveryEvent.from_delivery(delivery))
+
+
+delivery_updates = DeliveryUpdates.from_settings()
@@ -0,0 +1,271 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from functools import partial
+from typing import NamedTuple, Optional
+
+from django.conf import settings
+from django.db import connection as db_connection
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+from django.utils import timezone
+
+from .bulk import chunked
+from .cache import delivery_cache
+from .consumer import STAGE_SECONDS, BatchConsumer
+from .decoders import InvalidMessage
+from .geo import geohash_of
+from .live import delivery_updates
+from .metrics import registry
+from .models import ACTIVE_STATUSES, Delivery, DeliveryLocation
+
+logger = logging.getLogger(__name__)
+
+PINGS = registry.counter(
+    'delivery_location_pings_total',
+    'Courier location pings: received, written (latest per delivery and flush) or skipped (unknown or finished '
+    'deliveries, or older than the stored location).', ['outcome']
+)
+FLUSH_ROWS = registry.histogram(
+    'delivery_location_flush_rows', 'Deliveries updated per location flush.',
+    buckets=(1, 10, 50, 100, 500, 1000, 5000, 10000)
+)
+
+# Rows per UPDATE ... SET current_location = CASE ... statement.
+LOCATION_BATCH_SIZE = 500
+LOCATION_MAX_LENGTH = Delivery._meta.get_field('current_location').max_length
+
+
+class LocationPing(NamedTuple):
+    delivery_id: int
+    location: Optional[str]
+    recorded_at: datetime
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+
+    @property
+    def fields(self):
+        """The ``Delivery`` columns this ping sets."""
+        fields = ('current_location',) if self.location is not None else ()
+        if self.latitude is not None:
+            fields += ('latitude', 'longitude', 'geohash')
+        return fields + ('location_recorded_at',)
+
+    def values(self):
+        return {
+            'current_location': self.location, 'latitude': self.latitude, 'longitude': self.longitude,
+            'geohash': geohash_of(self.latitude, self.longitude), 'location_recorded_at': self.recorded_at,
+        }
+
+
+def parse_coordinate(value, limit):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not -limit <= value <= limit:
+        raise ValueError(f'coordinates must be numbers between -{limit} and {limit}')
+    return float(value)
+
+
+def parse_ping(data, received_at=None):
+    """Validate a decoded ``{"delivery_id", "location", "latitude", "longitude", "recorded_at"}`` message."""
+    try:
+        delivery_id = data['delivery_id']
+        location = data.get('location')
+        latitude = data.get('latitude')
+        longitude = data.get('longitude')
+        recorded_at = data.get('recorded_at')
+        if isinstance(delivery_id, bool) or not isinstance(delivery_id, int):
+            raise TypeError('delivery_id must be an integer')
+        if location is not None and (not isinstance(location, str) or not location
+                                     or len(location) > LOCATION_MAX_LENGTH):
+            raise ValueError(f'location must be a string of 1 to {LOCATION_MAX_LENGTH} characters')
+        if (latitude is None) != (longitude is None):
+            raise ValueError('latitude and longitude must be sent together')
+        if latitude is not None:
+            latitude, longitude = parse_coordinate(latitude, 90), parse_coordinate(longitude, 180)
+        elif location is None:
+            raise ValueError('a location, coordinates or both are required')
+        received_at = received_at or timezone.now()
+        if recorded_at is None:
+            recorded_at = received_at
+        else:
+            recorded_at = datetime.fromisoformat(recorded_at)
+            if timezone.is_naive(recorded_at):
+                recorded_at = timezone.make_aware(recorded_at)
+            # Clamped like the HTTP serializer's, so a future timestamp cannot block later pings.
+            recorded_at = min(recorded_at, received_at)
+    except (ValueError, LookupError, TypeError, AttributeError) as e:
+        raise InvalidMessage(f'{type(e).__name__}: {e}') from e
+    return LocationPing(delivery_id, location, recorded_at, latitude, longitude)
+
+
+def update_locations(pings, fields, now):
+    """
+    One ``UPDATE ... SET field = CASE id WHEN ... END`` for ``pings`` that
+    only changes rows whose ``location_recorded_at`` is older than the ping,
+    so a late or redelivered ping, or one flushed by another process, never
+    overwrites a newer location.
+    """
+    def case(field, values):
+        output_field = Delivery._meta.get_field(field)
+        return Case(
+            *[When(id=ping.delivery_id, then=Value(value[field], output_field=output_field))
+              for ping, value in zip(pings, values)],
+            output_field=output_field,
+        )
+
+    values = [ping.values() for ping in pings]
+    return (
+        Delivery.objects.filter(id__in=[ping.delivery_id for ping in pings])
+        .filter(Q(location_recorded_at__isnull=True) | Q(location_recorded_at__lt=case('location_recorded_at', values)))
+        .update(updated_at=now, **{field: case(field, values) for field in fields})
+    )
+
+
+def write_locations(pings, history=()):
+    """
+    Set the location of each delivery from one ping per delivery with
+    batched ``UPDATE`` statements that touch only the columns the pings
+    carry (``current_location`` and/or the coordinates and geohash),
+    ``location_recorded_at`` and ``updated_at``, and append ``history`` to
+    ``DeliveryLocation``. Pings for unknown or finished deliveries, and
+    pings older than the location already stored, are skipped. Returns the
+    ids updated.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        recorded = dict(
+            Delivery.objects.filter(id__in=[ping.delivery_id for ping in pings], status__in=ACTIVE_STATUSES)
+            .values_list('id', 'location_recorded_at')
+        )
+        groups = {}
+        for ping in pings:
+            if ping.delivery_id in recorded and (
+                    recorded[ping.delivery_id] is None or recorded[ping.delivery_id] < ping.recorded_at):
+                groups.setdefault(ping.fields, []).append(ping)
+        for fields, group in groups.items():
+            for batch in chunked(group, LOCATION_BATCH_SIZE):
+                update_locations(batch, fields, now)
+        if history:
+            DeliveryLocation.objects.bulk_create(
+                [DeliveryLocation(delivery_id=ping.delivery_id, location=ping.location, latitude=ping.latitude,
+                                  longitude=ping.longitude, recorded_at=ping.recorded_at)
+                 for ping in history if ping.delivery_id in recorded],
+                batch_size=LOCATION_BATCH_SIZE,
+            )
+        updated = [ping.delivery_id for group in groups.values() for ping in group]
+        delivery_cache.invalidate_many(updated)
+        transaction.on_commit(partial(delivery_updates.publish_ids, updated))
+    PINGS.inc('written', amount=len(updated))
+    PINGS.inc('skipped', amount=len(pings) - len(updated))
+    FLUSH_ROWS.observe(len(updated))
+    return updated
+
+
+class LocationCoalescer:
+    """
+    Collects location pings in memory and keeps only the latest one per
+    delivery, by ``recorded_at``. ``flush()`` writes them in a handful of
+    batched statements, so thousands of pings per second turn into one
+    write per delivery per flush. With ``history`` every ping is also kept
+    and appended to ``DeliveryLocation`` on flush.
+
+    ``start()`` flushes every ``flush_interval`` seconds from a daemon
+    thread; pings not yet flushed when the process dies are lost.
+    """
+
+    def __init__(self, flush_interval=1.0, history=False, autostart=True):
+        self.flush_interval = flush_interval
+        self.history = history
+        self.autostart = autostart
+        self.latest = {}
+        self.pending_history = []
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_settings(cls, **kwargs):
+        options = settings.LOCATION_PINGS
+        return cls(flush_interval=options['FLUSH_INTERVAL'], history=options['HISTORY'], **kwargs)
+
+    def __len__(self):
+        return len(self.latest)
+
+    def add(self, ping):
+        with self._lock:
+            current = self.latest.get(ping.delivery_id)
+            if current is None or ping.recorded_at >= current.recorded_at:
+                self.latest[ping.delivery_id] = ping
+            if self.history:
+                self.pending_history.append(ping)
+            if self.autostart and self._thread is None:
+                self.start()
+        PINGS.inc('received')
+
+    def flush(self):
+        with self._lock:
+            if not self.latest:
+                return []
+            latest, self.latest = self.latest, {}
+            history, self.pending_history = self.pending_history, []
+        return write_locations(list(latest.values()), history)
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name='location-coalescer', daemon=True)
+        self._thread.start()
+
+    def run(self):
+        try:
+            while not self._stop_event.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    logger.exception('Writing courier locations failed, dropping them')
+        finally:
+            db_connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+location_coalescer = LocationCoalescer.from_settings()
+
+
+class LocationConsumer(BatchConsumer):
+    """
+    Consumes location pings from AMQP into a ``LocationCoalescer``. A window
+    of up to ``batch_size`` pings is flushed every ``flush_interval`` seconds
+    and acknowledged once its writes have committed, so pings are never
+    lost, only coalesced.
+    """
+
+    def __init__(self, channel, queue, history=False, **kwargs):
+        super().__init__(channel, queue, **kwargs)
+        self.coalescer = LocationCoalescer(history=history, autostart=False)
+
+    def handle(self, method, properties, body):
+        started = time.perf_counter()
+        try:
+            ping = parse_ping(json.loads(body))
+        except ValueError as e:  # Includes InvalidMessage.
+            self.dead_letter(method, properties, body, e)
+            return
+        STAGE_SECONDS.observe(time.perf_counter() - started, 'decode')
+        if not self.pending:
+            self.deadline = time.monotonic() + self.flush_interval
+        self.pending.append((method.delivery_tag, ping))
+        self.coalescer.add(ping)
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        started = time.perf_counter()
+        self.coalescer.flush()
+        STAGE_SECONDS.observe(time.perf_counter() - started, 'db_write')
+        self.ack(pending[-1][0], multiple=True)
+        logger.info('Applied %d location pings', len(pending))
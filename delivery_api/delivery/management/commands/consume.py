@@ -1,54 +1,74 @@
-import pika
-import json
-from delivery.models import Delivery
-from urllib.parse import urlparse
-from decouple import config
-
-def on_message_received(ch, method, properties, body):
-    print(f'received: "{body}"')
-    try:
-        # Decode the byte string
-        body_str = body.decode('utf-8')
-        
-        # Parse the JSON string
-        message = json.loads(body_str)
-        
-        # Extract the relevant data
-        delivery_data = message[0][0]['order_data']
-        
-        # Create the Delivery object
-        delivery = Delivery.objects.create(
-            order_id=delivery_data['id'],
-            payment_method=delivery_data['payment_method'],
-            status=delivery_data['status'],
-            current_location=delivery_data['address'],
-            delivery_method=delivery_data['delivery_method']
-        )
-        delivery.save()
-        print(f'Delivery created: {delivery}')
-    except Exception as e:
-        print(f'Error creating delivery: {str(e)}')
-    ch.basic_ack(delivery_tag=method.delivery_tag)
-
-BROKER_URL = config('CLOUDAMQP_URL')
-parsed_url = urlparse(BROKER_URL)
-
-connection_parameters = pika.ConnectionParameters(
-    host=parsed_url.hostname,
-    port=parsed_url.port or 5672,
-    virtual_host=parsed_url.path[1:] or '/',
-    credentials=pika.PlainCredentials(parsed_url.username, parsed_url.password)
-)
-try:
-    connection = pika.BlockingConnection(connection_parameters)
-    channel = connection.channel()
-    channel.basic_qos(prefetch_count=1)
-    channel.basic_consume(queue='delivery_queue', on_message_callback=on_message_received)
-
-    print('Starting Consuming')
-
-    channel.start_consuming()
-except pika.exceptions.AMQPConnectionError as e:
-    print(f'Error connecting to RabbitMQ: {str(e)}')
-except Exception as e:
-    print(f'An error occurred: {str(e)}')
+import signal
+
+from django.core.management.base import BaseCommand
+
+from delivery.consumer import ConsumerPool
+from delivery.metrics import start_http_server
+
+
+class Command(BaseCommand):
+    help = 'Consume order messages from RabbitMQ and create the matching deliveries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default='delivery_queue')
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of consumer threads, each with its own connection and channel.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1,
+            help='Insert up to this many deliveries per transaction. 1 acks every message on its own.'
+        )
+        parser.add_argument(
+            '--flush-interval', type=float, default=1.0,
+            help='Flush a partial batch after this many seconds.'
+        )
+        parser.add_argument(
+            '--prefetch', type=int,
+            help='Prefetch window per worker. Defaults to the batch size.'
+        )
+        parser.add_argument(
+            '--dead-letter-queue',
+            help='Publish undecodable messages to this queue. By default they are rejected without requeueing.'
+        )
+        parser.add_argument(
+            '--max-reconnect-delay', type=float, default=30.0,
+            help='Upper bound in seconds for the reconnect backoff.'
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help='Serve Prometheus metrics for this process on this port.'
+        )
+        parser.add_argument(
+            '--stats-interval', type=float, default=60.0,
+            help='Log a JSON line of throughput and stage timings every this many seconds. 0 disables it.'
+        )
+
+    def handle(self, *args, **options):
+        pool = ConsumerPool(
+            options['workers'],
+            options['queue'],
+            stats_interval=options['stats_interval'],
+            max_reconnect_delay=options['max_reconnect_delay'],
+            consumer_options={
+                'batch_size': options['batch_size'],
+                'flush_interval': options['flush_interval'],
+                'prefetch_count': options['prefetch'],
+                'dead_letter_queue': options['dead_letter_queue'],
+            },
+        )
+
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}")
+
+        def shutdown(signum, frame):
+            self.stdout.write('Shutting down, draining in-flight messages')
+            pool.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Starting Consuming with {options['workers']} worker(s)")
+        pool.run()
+        self.stdout.write('Stopped')
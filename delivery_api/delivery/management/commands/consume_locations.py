@@ -0,0 +1,67 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from delivery.consumer import ConsumerPool
+from delivery.locations import LocationConsumer
+from delivery.metrics import start_http_server
+
+
+class Command(BaseCommand):
+    help = 'Consume courier location pings from RabbitMQ and write the latest location of each delivery.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queue', default=settings.LOCATION_PINGS['QUEUE'])
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Number of consumer threads, each with its own connection and channel.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Coalesce up to this many pings per flush.'
+        )
+        parser.add_argument(
+            '--flush-interval', type=float, default=settings.LOCATION_PINGS['FLUSH_INTERVAL'],
+            help='Flush the pings received so far after this many seconds.'
+        )
+        parser.add_argument(
+            '--history', action='store_true', default=settings.LOCATION_PINGS['HISTORY'],
+            help='Also keep every ping in the location history table.'
+        )
+        parser.add_argument(
+            '--dead-letter-queue',
+            help='Publish undecodable pings to this queue. By default they are rejected without requeueing.'
+        )
+        parser.add_argument(
+            '--metrics-port', type=int,
+            help='Serve Prometheus metrics for this process on this port.'
+        )
+
+    def handle(self, *args, **options):
+        pool = ConsumerPool(
+            options['workers'],
+            options['queue'],
+            consumer_class=LocationConsumer,
+            consumer_options={
+                'batch_size': options['batch_size'],
+                'flush_interval': options['flush_interval'],
+                'history': options['history'],
+                'dead_letter_queue': options['dead_letter_queue'],
+            },
+        )
+
+        if options['metrics_port']:
+            start_http_server(options['metrics_port'])
+            self.stdout.write(f"Serving metrics on port {options['metrics_port']}")
+
+        def shutdown(signum, frame):
+            self.stdout.write('Shutting down, flushing pending pings')
+            pool.stop()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        self.stdout.write(f"Starting Consuming locations with {options['workers']} worker(s)")
+        pool.run()
+        self.stdout.write('Stopped')
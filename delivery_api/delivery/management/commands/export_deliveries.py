@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.exceptions import ValidationError
+
+from delivery.export import EXPORT_CHUNK_SIZE, EXPORT_CONTENT_TYPES, export_queryset, parse_export_filters, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Stream deliveries to a file or stdout as newline delimited JSON or CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', '-o', help='File to write to. Defaults to stdout.')
+        parser.add_argument('--format', choices=list(EXPORT_CONTENT_TYPES), default='ndjson')
+        parser.add_argument('--status', help='Comma separated statuses to include.')
+        parser.add_argument('--updated-since', help='ISO 8601 date or datetime, inclusive.')
+        parser.add_argument('--updated-before', help='ISO 8601 date or datetime, exclusive.')
+        parser.add_argument('--chunk-size', type=int, default=EXPORT_CHUNK_SIZE, help='Rows fetched per query round trip.')
+
+    def handle(self, *args, **options):
+        try:
+            filters = parse_export_filters(options)
+        except ValidationError as e:
+            raise CommandError(e.detail)
+
+        exported = 0
+
+        def rows():
+            nonlocal exported
+            for row in export_queryset(**filters).iterator(chunk_size=options['chunk_size']):
+                exported += 1
+                yield row
+
+        start = time.monotonic()
+        output = open(options['output'], 'wb') if options['output'] else None
+        try:
+            for chunk in stream_export(rows(), options['format']):
+                if output is None:
+                    self.stdout.write(chunk.decode('utf-8'), ending='')
+                else:
+                    output.write(chunk)
+        finally:
+            if output is not None:
+                output.close()
+        elapsed = time.monotonic() - start
+        # Keep the summary out of an export written to stdout.
+        summary = self.stdout if output is not None else self.stderr
+        summary.write(
+            f'Exported {exported} deliveries in {elapsed:.1f}s ({exported / max(elapsed, 1e-9):.0f} rows/s)',
+            style_func=self.style.SUCCESS
+        )
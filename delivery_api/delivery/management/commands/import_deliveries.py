@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from delivery.importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_file
+
+
+class Command(BaseCommand):
+    help = 'Bulk load historical deliveries from a CSV or newline delimited JSON file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='Defaults to the file extension.')
+        parser.add_argument(
+            '--rejects', help='Where to write rejected rows and their errors. Defaults to <path>.rejects.ndjson.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=min(os.cpu_count() or 1, 5) - 1,
+            help='Processes parsing and validating rows while this one inserts; 0 parses in this process.'
+        )
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Rows per parse and insert batch.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        if import_format == 'jsonl':
+            import_format = 'ndjson'
+        if import_format not in IMPORT_FORMATS:
+            raise CommandError(f'Cannot tell the format of {path}; pass --format.')
+        rejects_path = options['rejects'] or f'{path}.rejects.ndjson'
+
+        try:
+            with open(path, newline='', encoding='utf-8') as file, open(rejects_path, 'w') as rejects:
+                report = import_file(file, rejects, import_format, options['workers'], options['chunk_size'])
+        except FileNotFoundError as e:
+            raise CommandError(e)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {report.imported} of {report.rows} deliveries in {report.seconds:.1f}s '
+            f'({report.rows_per_second:.0f} rows/s)'
+        ))
+        if report.rejected:
+            self.stdout.write(self.style.WARNING(f'{report.rejected} rows rejected, see {rejects_path}'))
+        else:
+            os.remove(rejects_path)
@@ -0,0 +1,56 @@
+import signal
+import time
+
+import pika
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from delivery.consumer import connect
+from delivery.outbox import drain, open_channel
+
+
+class Command(BaseCommand):
+    help = 'Publish queued delivery events from the outbox table to RabbitMQ.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exchange', default=settings.DELIVERY_EVENTS_EXCHANGE)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--interval', type=float, default=1.0,
+            help='Seconds to wait before polling again once the outbox is empty.'
+        )
+        parser.add_argument('--once', action='store_true', help='Drain the outbox once and exit.')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        while self.running:
+            try:
+                self.publish(options)
+            except pika.exceptions.AMQPError as e:
+                self.stderr.write(f'Error publishing to RabbitMQ: {str(e)}')
+                if options['once']:
+                    raise
+                time.sleep(options['interval'])
+            else:
+                break
+
+    def publish(self, options):
+        connection = connect()
+        try:
+            channel = open_channel(connection, options['exchange'])
+            total = 0
+            while self.running:
+                total += drain(channel, options['exchange'], options['batch_size'])
+                if options['once']:
+                    break
+                connection.sleep(options['interval'])
+            self.stdout.write(f'Published {total} events')
+        finally:
+            if connection.is_open:
+                connection.close()
+
+    def stop(self, signum, frame):
+        self.running = False
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from delivery.eta import recompute_etas
+from delivery.models import Delivery
+from delivery.tasks import recompute_etas_task
+
+
+class Command(BaseCommand):
+    help = 'Recompute estimated delivery times in chunked UPDATE statements.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000)
+        parser.add_argument(
+            '--only-missing', action='store_true',
+            help='Only fill in deliveries that have no estimated delivery time yet.'
+        )
+        parser.add_argument(
+            '--enqueue', action='store_true',
+            help='Run the recomputation in a Celery worker instead of in this process.'
+        )
+
+    def handle(self, *args, **options):
+        if options['enqueue']:
+            task = recompute_etas_task.delay(options['only_missing'], options['chunk_size'])
+            self.stdout.write(f'Queued ETA recomputation as task {task.id}')
+            return
+        queryset = Delivery.objects.all()
+        if options['only_missing']:
+            queryset = queryset.filter(estimated_delivery_time__isnull=True)
+        start = time.monotonic()
+        updated = recompute_etas(queryset, chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Recomputed {updated} estimated delivery times in {time.monotonic() - start:.1f}s'
+        ))
@@ -0,0 +1,219 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; spans a cache hit to a slow bulk request.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def values(self):
+        with self._lock:
+            return dict(self._values)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}'
+
+
+class Histogram:
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts, with +Inf last, sum]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def totals(self):
+        """Return ``{labels: (count, sum)}`` for every series."""
+        with self._lock:
+            return {labels: (sum(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def samples(self):
+        with self._lock:
+            series = [(labels, list(counts), total) for labels, (counts, total) in self._series.items()]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                bucket = format_labels(self.labelnames, labels, [('le', bound)])
+                yield f'{self.name}_bucket{bucket} {cumulative}'
+            yield f'{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}'
+            yield f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}'
+
+
+class Gauge:
+    """
+    A value read when the metrics are rendered, e.g. from a ``stats()`` dict.
+    Pass ``type='counter'`` for values that only ever grow.
+    """
+
+    def __init__(self, name, documentation, read, type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+        self.type = type
+
+    def samples(self):
+        value = self.read()
+        if value is not None:
+            yield f'{self.name} {format_value(value)}'
+
+
+class MetricsRegistry:
+    """
+    Process-wide metrics rendered in the Prometheus text format. Recording
+    takes one short lock per metric, so it is cheap enough for every request.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, read, type='gauge'):
+        return self.register(Gauge(name, documentation, read, type))
+
+    def render(self):
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_http_server(port, address=''):
+    """
+    Serve the registry on ``port`` from a daemon thread, for processes that
+    do not run the Django HTTP stack, such as the order consumer.
+    """
+    server = ThreadingHTTPServer((address, port), MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+    return server
+
+
+class RequestStats:
+    """Database and serializer time spent on behalf of the current request."""
+    __slots__ = ('queries', 'query_seconds', 'serializer_seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.serializer_seconds = 0.0
+
+
+# Context variables follow a request into sync_to_async() threads, so queries
+# made by the async views are attributed to their request too.
+request_stats = ContextVar('request_stats', default=None)
+
+
+def record_query(execute, sql, params, many, context):
+    stats = request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.query_seconds += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """``connection_created`` receiver, see ``DeliveryConfig.ready``."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+SERIALIZER_SECONDS = registry.histogram(
+    'delivery_serializer_duration_seconds', 'Time spent rendering serializer data.', ['serializer']
+)
+
+
+class TimedSerializerMixin:
+    """Records how long building ``.data`` takes, per serializer class and for the current request."""
+
+    @property
+    def data(self):
+        start = time.perf_counter()
+        data = super().data
+        elapsed = time.perf_counter() - start
+        SERIALIZER_SECONDS.observe(elapsed, type(self).__name__)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.serializer_seconds += elapsed
+        return data
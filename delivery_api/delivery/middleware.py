@@ -0,0 +1,78 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+from .metrics import COUNT_BUCKETS, RequestStats, registry, request_stats
+
+logger = logging.getLogger('delivery.requests')
+
+REQUEST_SECONDS = registry.histogram(
+    'delivery_http_request_duration_seconds', 'Time to produce a response, by view.',
+    ['view', 'method', 'status']
+)
+REQUEST_QUERIES = registry.histogram(
+    'delivery_http_request_queries', 'SQL queries executed per request, by view.',
+    ['view', 'method'], buckets=COUNT_BUCKETS
+)
+REQUEST_QUERY_SECONDS = registry.histogram(
+    'delivery_http_request_query_duration_seconds', 'Time spent in SQL per request, by view.', ['view', 'method']
+)
+# Anything else is recorded as 'other', so clients cannot grow the label set.
+HTTP_METHODS = frozenset(['GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'])
+
+
+class RequestMetricsMiddleware:
+    """
+    Records latency, SQL query count and time, and serializer time per view,
+    and logs requests that exceed the ``REQUEST_METRICS`` slow thresholds.
+    Put it first in ``MIDDLEWARE`` so the latency covers the other middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.slow_seconds = settings.REQUEST_METRICS['SLOW_REQUEST_SECONDS']
+        self.slow_queries = settings.REQUEST_METRICS['SLOW_REQUEST_QUERIES']
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_stats.reset(token)
+        self.record(request, response, time.perf_counter() - start, stats)
+        return response
+
+    def record(self, request, response, elapsed, stats):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        method = request.method if request.method in HTTP_METHODS else 'other'
+        REQUEST_SECONDS.observe(elapsed, view, method, str(response.status_code))
+        REQUEST_QUERIES.observe(stats.queries, view, method)
+        REQUEST_QUERY_SECONDS.observe(stats.query_seconds, view, method)
+        if elapsed >= self.slow_seconds or stats.queries >= self.slow_queries:
+            logger.warning(
+                'Slow request %s %s (%s) -> %s: %.1f ms, %d queries in %.1f ms, serializers %.1f ms',
+                request.method, request.get_full_path(), view, response.status_code, elapsed * 1000,
+                stats.queries, stats.query_seconds * 1000, stats.serializer_seconds * 1000
+            )
@@ -0,0 +1,25 @@
+# Generated by Django 5.0.7 on 2026-10-18 19:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0006_remove_delivery_delivery_provider_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['order_id', 'created_at'], name='delivery_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', 'updated_at'], name='delivery_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(condition=models.Q(('status__in', ['on_hold', 'ready', 'on_the_way'])), fields=['updated_at'], name='delivery_active_idx'),
+        ),
+    ]
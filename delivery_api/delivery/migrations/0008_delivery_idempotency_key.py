@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0007_delivery_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='idempotency_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+    ]
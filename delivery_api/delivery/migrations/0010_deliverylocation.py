@@ -0,0 +1,26 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0009_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryLocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('location', models.CharField(max_length=255)),
+                ('recorded_at', models.DateTimeField()),
+                ('delivery', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='locations', to='delivery.delivery')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['delivery', 'recorded_at'], name='location_delivery_recorded_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:39
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0010_deliverylocation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='geohash',
+            field=models.CharField(blank=True, editable=False, max_length=9, null=True),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-90), django.core.validators.MaxValueValidator(90)]),
+        ),
+        migrations.AddField(
+            model_name='delivery',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(-180), django.core.validators.MaxValueValidator(180)]),
+        ),
+        migrations.AddField(
+            model_name='deliverylocation',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverylocation',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='deliverylocation',
+            name='location',
+            field=models.CharField(blank=True, max_length=255, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['status', 'geohash'], name='delivery_status_geohash_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0011_delivery_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='delivery',
+            name='location_recorded_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
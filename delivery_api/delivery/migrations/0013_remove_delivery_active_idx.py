@@ -0,0 +1,17 @@
+# Generated by Django 5.0.7 on 2026-10-18 20:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('delivery', '0012_delivery_location_recorded_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='delivery',
+            name='delivery_active_idx',
+        ),
+    ]
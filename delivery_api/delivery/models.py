@@ -1,6 +1,22 @@
-from django.db import models
+from functools import partial
+
+from django.core.validators import MaxValueValidator, MinValueValidator
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+import logging
 import uuid
-from datetime import datetime, timedelta
+
+from .cache import delivery_cache
+from .eta import estimate
+from .geo import GEOHASH_PRECISION, geohash_of
+from .live import delivery_updates
+
+logger = logging.getLogger(__name__)
+
+# Statuses a delivery can still move on from.
+ACTIVE_STATUSES = ['on_hold', 'ready', 'on_the_way']
+
 
 class Delivery(models.Model):
     DELIVERY_CHOICES = [
@@ -22,25 +38,78 @@ class Delivery(models.Model):
         ('cancelled', 'Cancelled'),
     ], default='on_hold')
     current_location = models.CharField(max_length=255, null=True, blank=True) 
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # Derived from latitude and longitude; indexed for the nearby search.
+    geohash = models.CharField(max_length=GEOHASH_PRECISION, null=True, blank=True, editable=False)
+    # recorded_at of the location ping last applied, so that late pings cannot overwrite newer ones.
+    location_recorded_at = models.DateTimeField(null=True, blank=True, editable=False)
     estimated_delivery_time = models.DateTimeField(null=True, blank=True) 
     delivery_method = models.CharField(max_length=20, choices=DELIVERY_CHOICES, default='standard')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set by the order consumer so that redelivered messages do not create duplicate rows.
+    idempotency_key = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_id', 'created_at'], name='delivery_order_created_idx'),
+            models.Index(fields=['status', 'updated_at'], name='delivery_status_updated_idx'),
+            # Not partial: SQLite cannot match a partial index's condition against bound parameters.
+            models.Index(fields=['status', 'geohash'], name='delivery_status_geohash_idx'),
+        ]
 
     def calculate_estimated_delivery_time(self):
-        if self.delivery_method == 'standard':
-            return datetime.now() + timedelta(days=5)
-        elif self.delivery_method == 'express':
-            return datetime.now() + timedelta(days=2)
-        elif self.delivery_method == 'overnight':
-            return datetime.now() + timedelta(days=1)
-        return None
+        return estimate(self.delivery_method, self.created_at or timezone.now())
 
     def save(self, *args, **kwargs):
         self.estimated_delivery_time = self.calculate_estimated_delivery_time()
-        print(f"Calculated estimated delivery time: {self.estimated_delivery_time}")
+        self.geohash = geohash_of(self.latitude, self.longitude)
         super().save(*args, **kwargs)
-        print(f"Saved delivery with estimated time: {self.estimated_delivery_time}")
+        delivery_cache.invalidate(self.pk)
+        transaction.on_commit(partial(delivery_updates.publish, self))
+        logger.debug("Saved delivery %s with estimated time %s", self.pk, self.estimated_delivery_time)
 
     def __str__(self):
         return f'{self.id}'
+
+
+class OutboxEvent(models.Model):
+    """
+    An event waiting to be published to the broker. Rows are written in the
+    same transaction as the change they describe and drained by the
+    publish_events command, so an event is never lost or sent for a rolled
+    back change.
+    """
+    routing_key = models.CharField(max_length=255)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    published_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['id'], name='outbox_unpublished_idx', condition=Q(published_at__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f'{self.routing_key} #{self.id}'
+
+
+class DeliveryLocation(models.Model):
+    """
+    A courier location ping. Only written when ``LOCATION_PINGS['HISTORY']``
+    is on; ``Delivery.current_location`` always holds the latest one.
+    """
+    delivery = models.ForeignKey(Delivery, on_delete=models.CASCADE, related_name='locations')
+    location = models.CharField(max_length=255, null=True, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    recorded_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['delivery', 'recorded_at'], name='location_delivery_recorded_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.delivery_id} @ {self.recorded_at}'
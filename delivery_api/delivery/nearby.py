@@ -0,0 +1,63 @@
+import heapq
+import math
+
+from rest_framework.exceptions import ValidationError
+
+from .geo import covering_cells, geohash_filter, haversine
+from .models import ACTIVE_STATUSES, Delivery
+
+# Defaults and limits for the search, in metres and deliveries.
+NEARBY_RADIUS = 1000
+NEARBY_MAX_RADIUS = 50000
+NEARBY_LIMIT = 50
+NEARBY_MAX_LIMIT = 500
+
+
+def parse_number(params, name, default=None, low=None, high=None, cast=float):
+    value = params.get(name)
+    if value in (None, ''):
+        if default is None:
+            raise ValidationError({name: 'This parameter is required.'})
+        return default
+    try:
+        value = cast(value)
+    except ValueError:
+        raise ValidationError({name: f'Expected a number, got "{value}".'})
+    if not math.isfinite(value) or (low is not None and value < low) or (high is not None and value > high):
+        raise ValidationError({name: f'Expected a value between {low} and {high}.'})
+    return value
+
+
+def parse_nearby_params(params):
+    """Validate ``lat``, ``lng``, ``radius`` (metres) and ``limit`` as keyword arguments for ``nearby``."""
+    return {
+        'latitude': parse_number(params, 'lat', low=-90, high=90),
+        'longitude': parse_number(params, 'lng', low=-180, high=180),
+        'radius': parse_number(params, 'radius', NEARBY_RADIUS, low=0, high=NEARBY_MAX_RADIUS),
+        'limit': parse_number(params, 'limit', NEARBY_LIMIT, low=1, high=NEARBY_MAX_LIMIT, cast=int),
+    }
+
+
+def nearby_candidates(latitude, longitude, radius):
+    """Active deliveries in the geohash cells around the point, as ``(id, latitude, longitude)``."""
+    cells = covering_cells(latitude, longitude, radius)
+    return (
+        Delivery.objects.filter(geohash_filter(cells, status__in=ACTIVE_STATUSES), geohash__isnull=False)
+        .values_list('id', 'latitude', 'longitude')
+    )
+
+
+def nearby(latitude, longitude, radius=NEARBY_RADIUS, limit=NEARBY_LIMIT):
+    """
+    Active deliveries within ``radius`` metres of the point, nearest first,
+    as ``(delivery, distance)`` pairs. Candidates come from the geohash
+    index and only they are ranked by haversine distance.
+    """
+    candidates = list(nearby_candidates(latitude, longitude, radius))
+    if not candidates:
+        return []
+    ids, latitudes, longitudes = zip(*candidates)
+    distances = haversine(latitude, longitude, latitudes, longitudes)
+    ranked = heapq.nsmallest(limit, ((distance, pk) for pk, distance in zip(ids, distances) if distance <= radius))
+    deliveries = Delivery.objects.in_bulk([pk for _, pk in ranked])
+    return [(deliveries[pk], distance) for distance, pk in ranked if pk in deliveries]
@@ -0,0 +1,77 @@
+import json
+import logging
+
+import pika
+from django.db import transaction
+from django.utils import timezone
+
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+STATUS_CHANGED = 'delivery.status_changed'
+
+
+def status_changed_event(delivery_id, order_id, previous_status, status, changed_at):
+    return OutboxEvent(
+        routing_key=STATUS_CHANGED,
+        payload={
+            'delivery_id': delivery_id,
+            'order_id': order_id,
+            'previous_status': previous_status,
+            'status': status,
+            'changed_at': changed_at.isoformat(),
+        },
+    )
+
+
+def record_status_change(delivery, previous_status):
+    """Queue a status change event. Call inside the transaction that saved ``delivery``."""
+    status_changed_event(delivery.id, delivery.order_id, previous_status, delivery.status, delivery.updated_at).save()
+
+
+def publish_pending(channel, exchange, batch_size=500):
+    """
+    Publish up to ``batch_size`` unpublished events in id order on ``channel``
+    (expected to be in confirm mode) and mark them published. Returns the
+    number of events sent.
+
+    A crash between publishing and marking sends the batch again, so
+    consumers should de-duplicate on the message id.
+    """
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(published_at__isnull=True)
+            .order_by('id')[:batch_size]
+        )
+        for event in events:
+            channel.basic_publish(
+                exchange=exchange,
+                routing_key=event.routing_key,
+                body=json.dumps(event.payload),
+                properties=pika.BasicProperties(
+                    content_type='application/json',
+                    delivery_mode=pika.DeliveryMode.Persistent,
+                    message_id=f'outbox-{event.id}',
+                ),
+            )
+        if events:
+            OutboxEvent.objects.filter(id__in=[event.id for event in events]).update(published_at=timezone.now())
+    return len(events)
+
+
+def open_channel(connection, exchange):
+    """Declare the events exchange and return a channel in publisher-confirm mode."""
+    channel = connection.channel()
+    channel.exchange_declare(exchange=exchange, exchange_type='topic', durable=True)
+    channel.confirm_delivery()
+    return channel
+
+
+def drain(channel, exchange, batch_size=500):
+    """Publish batches until the outbox is empty. Returns the number of events sent."""
+    total = 0
+    while published := publish_pending(channel, exchange, batch_size):
+        total += published
+    return total
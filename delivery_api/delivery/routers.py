@@ -0,0 +1,45 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+@contextmanager
+def read_replica():
+    """Route the reads made inside this block to the replica, if one is configured."""
+    token = replica_reads.set(True)
+    try:
+        yield
+    finally:
+        replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Sends reads made inside ``read_replica()`` to the ``replica`` database
+    and everything else to ``default``. Reads inside a transaction stay on
+    ``default`` so they see the transaction's own writes.
+    """
+    replica = 'replica'
+
+    def db_for_read(self, model, **hints):
+        if (
+            replica_reads.get()
+            and self.replica in settings.DATABASES
+            and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+        ):
+            return self.replica
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica receives its schema from the primary.
+        return db != self.replica
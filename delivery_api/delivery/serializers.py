@@ -1,8 +1,63 @@
+from django.utils import timezone
 from rest_framework import serializers
+from .metrics import TimedSerializerMixin
 from .models import Delivery
 
-class  DeliverySerializer(serializers.ModelSerializer):
+
+def validate_coordinates(attrs):
+    # A geohash needs both, so they are set (or cleared) together.
+    if ('latitude' in attrs) != ('longitude' in attrs) or (
+            (attrs.get('latitude') is None) != (attrs.get('longitude') is None)):
+        raise serializers.ValidationError('Set latitude and longitude together.')
+
+
+class  DeliverySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Delivery
-        fields = ['order_id', 'payment_method','current_location','delivery_method','status']
+        fields = ['order_id', 'payment_method','current_location','latitude','longitude','delivery_method','status']
         read_only_fields = ['id','created_at', 'updated_at']
+
+    def validate(self, attrs):
+        validate_coordinates(attrs)
+        return attrs
+
+
+class DeliveryResponseSerializer(TimedSerializerMixin, serializers.Serializer):
+    """Read-only representation of a delivery as returned by the delivery endpoints."""
+
+    def get_fields(self):
+        # Several of the public keys contain spaces, so they cannot be declared as class attributes.
+        return {
+            'delivery_id': serializers.IntegerField(source='id'),
+            'order id': serializers.IntegerField(source='order_id'),
+            'payment method': serializers.CharField(source='payment_method'),
+            'status': serializers.CharField(),
+            'current location': serializers.CharField(source='current_location', allow_null=True),
+            'latitude': serializers.FloatField(allow_null=True),
+            'longitude': serializers.FloatField(allow_null=True),
+            'estimated_delivery_time': serializers.DateTimeField(allow_null=True),
+            'delivery method': serializers.CharField(source='delivery_method'),
+            'created date': serializers.DateTimeField(source='created_at'),
+        }
+
+
+class DeliveryStatusUpdateSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    status = serializers.ChoiceField(choices=Delivery._meta.get_field('status').choices)
+
+
+class LocationPingSerializer(serializers.Serializer):
+    location = serializers.CharField(max_length=Delivery._meta.get_field('current_location').max_length, required=False)
+    latitude = serializers.FloatField(min_value=-90, max_value=90, required=False)
+    longitude = serializers.FloatField(min_value=-180, max_value=180, required=False)
+    recorded_at = serializers.DateTimeField(required=False)
+
+    def validate_recorded_at(self, value):
+        # A courier clock running ahead would otherwise block every later ping for the delivery.
+        return min(value, timezone.now())
+
+    def validate(self, attrs):
+        validate_coordinates(attrs)
+        if 'location' not in attrs and 'latitude' not in attrs:
+            raise serializers.ValidationError('Send a location, coordinates or both.')
+        return attrs
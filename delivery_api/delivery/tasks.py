@@ -0,0 +1,72 @@
+import pika
+from celery import shared_task
+from django.conf import settings
+from django.core.cache import caches
+
+from .bulk import import_deliveries
+from .consumer import connect
+from .eta import recompute_etas
+from .models import Delivery
+from .outbox import drain, open_channel
+
+
+@shared_task
+def recompute_etas_task(only_missing=False, chunk_size=10000):
+    queryset = Delivery.objects.all()
+    if only_missing:
+        queryset = queryset.filter(estimated_delivery_time__isnull=True)
+    return recompute_etas(queryset, chunk_size=chunk_size)
+
+
+class EventPublisher:
+    """
+    Keeps one AMQP connection and confirm-mode channel per worker process, so
+    that beat runs do not connect and tear down every few seconds.
+    """
+
+    def __init__(self):
+        self.connection = None
+        self.channel = None
+
+    def publish(self, exchange, batch_size):
+        if self.connection is None or not self.connection.is_open:
+            self.connection = connect()
+            self.channel = open_channel(self.connection, exchange)
+        try:
+            return drain(self.channel, exchange, batch_size)
+        except pika.exceptions.AMQPError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None and self.connection.is_open:
+            self.connection.close()
+        self.connection = self.channel = None
+
+
+event_publisher = EventPublisher()
+
+PUBLISH_LOCK_KEY = 'delivery:publish-events'
+# Released when the run ends; the timeout only frees the lock of a worker that died mid-run.
+PUBLISH_LOCK_TIMEOUT = 300
+
+
+@shared_task(ignore_result=True)
+def publish_delivery_events(batch_size=500):
+    """
+    Send every pending outbox event. Runs on a beat schedule, see
+    CELERY_BEAT_SCHEDULE, and does nothing while another run holds the lock.
+    """
+    lock = caches[settings.DELIVERY_EVENTS_LOCK_ALIAS]
+    if not lock.add(PUBLISH_LOCK_KEY, True, PUBLISH_LOCK_TIMEOUT):
+        return 0
+    try:
+        return event_publisher.publish(settings.DELIVERY_EVENTS_EXCHANGE, batch_size)
+    finally:
+        lock.delete(PUBLISH_LOCK_KEY)
+
+
+@shared_task
+def import_deliveries_task(items):
+    results, succeeded = import_deliveries(items)
+    return {'succeeded': succeeded, 'failed': len(results) - succeeded, 'results': results}
@@ -0,0 +1,85 @@
+from functools import partial
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+
+from .cache import delivery_cache
+from .eta import estimate
+from .geo import geohash_of
+from .live import delivery_updates
+from .models import Delivery
+from .outbox import record_status_change
+
+# Status -> statuses it may move to. A delivery can be cancelled until it is delivered.
+TRANSITIONS = {
+    'on_hold': frozenset({'ready', 'cancelled'}),
+    'ready': frozenset({'on_the_way', 'cancelled'}),
+    'on_the_way': frozenset({'delivered', 'cancelled'}),
+    'delivered': frozenset(),
+    'cancelled': frozenset(),
+}
+
+# Status -> statuses it may be reached from.
+SOURCES = {
+    target: frozenset(source for source, targets in TRANSITIONS.items() if target in targets)
+    for target in TRANSITIONS
+}
+
+
+class TransitionConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'conflict'
+
+    def __init__(self, current_status, new_status):
+        self.current_status = current_status
+        super().__init__(f"Cannot change status from '{current_status}' to '{new_status}'.")
+
+
+def can_transition(current_status, new_status):
+    return new_status == current_status or new_status in TRANSITIONS[current_status]
+
+
+def update_delivery(delivery, **changes):
+    """
+    Write ``changes`` (validated field values) to ``delivery`` with a single
+    ``UPDATE`` of just the changed columns and ``updated_at``.
+
+    A status change must be allowed by ``TRANSITIONS`` and is only applied
+    if the row still has the status ``delivery`` was read with, so of two
+    concurrent updaters one wins and the other gets ``TransitionConflict``.
+    The ETA is recomputed only when the delivery method changes, and the
+    geohash only when the coordinates do. Status
+    changes are recorded in the outbox in the same transaction.
+    """
+    changes = {field: value for field, value in changes.items() if getattr(delivery, field) != value}
+    if not changes:
+        return delivery
+    previous_status = delivery.status
+    queryset = Delivery.objects.filter(pk=delivery.pk)
+    if 'status' in changes:
+        if not can_transition(previous_status, changes['status']):
+            raise TransitionConflict(previous_status, changes['status'])
+        queryset = queryset.filter(status=previous_status)
+    if 'delivery_method' in changes:
+        changes['estimated_delivery_time'] = estimate(changes['delivery_method'], delivery.created_at)
+    if 'latitude' in changes or 'longitude' in changes:
+        changes['geohash'] = geohash_of(
+            changes.get('latitude', delivery.latitude), changes.get('longitude', delivery.longitude)
+        )
+    changes['updated_at'] = timezone.now()
+
+    with transaction.atomic():
+        if not queryset.update(**changes):
+            current_status = Delivery.objects.filter(pk=delivery.pk).values_list('status', flat=True).first()
+            if current_status is None:
+                raise NotFound('No Delivery matches the given query.')
+            raise TransitionConflict(current_status, changes['status'])
+        for field, value in changes.items():
+            setattr(delivery, field, value)
+        if 'status' in changes:
+            record_status_change(delivery, previous_status)
+        transaction.on_commit(partial(delivery_updates.publish, delivery))
+    delivery_cache.invalidate(delivery.pk)
+    return delivery
@@ -1,10 +1,16 @@
 from django.urls import path
-from .views import RootAPIView,DeliveryCreateView, DeliveryDetailView, OrderDeliveriesListView
+from .views import RootAPIView,DeliveryCreateView, DeliveryBulkCreateView, DeliveryBulkImportStatusView, DeliveryBulkStatusView, DeliveryDetailView, DeliveryExportView, DeliveryLocationView, NearbyDeliveriesView, OrderDeliveriesListView
 
 urlpatterns = [
     path('', RootAPIView.as_view(), name='root-api'),
     path('deliveries/', DeliveryCreateView.as_view(), name='create-delivery'),
+    path('deliveries/bulk/', DeliveryBulkCreateView.as_view(), name='bulk-create-deliveries'),
+    path('deliveries/bulk/<str:task_id>/', DeliveryBulkImportStatusView.as_view(), name='bulk-import-status'),
+    path('deliveries/bulk-status/', DeliveryBulkStatusView.as_view(), name='bulk-update-delivery-status'),
+    path('deliveries/export/', DeliveryExportView.as_view(), name='export-deliveries'),
+    path('deliveries/nearby/', NearbyDeliveriesView.as_view(), name='nearby-deliveries'),
     path('deliveries/<str:delivery_id>/', DeliveryDetailView.as_view(), name='delivery-detail'),
+    path('deliveries/<int:delivery_id>/location/', DeliveryLocationView.as_view(), name='delivery-location'),
     path('orders/<int:orderId>/deliveries/', OrderDeliveriesListView.as_view(), name='order-deliveries'),
 ]
 
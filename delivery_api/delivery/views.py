@@ -1,15 +1,74 @@
 from rest_framework import status, generics
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny, AllowAny
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponse, StreamingHttpResponse
 from django.urls import reverse_lazy
+from django.utils import timezone
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
+from .metrics import registry
 from .models import Delivery
-from .serializers import DeliverySerializer
+from .bulk import bulk_update_status, import_deliveries
+from .cache import delivery_cache
+from .conditional import delivery_etag, not_modified, queryset_etag
+from .export import (
+    EXPORT_CHUNK_SIZE, EXPORT_CONTENT_TYPES, export_queryset, parse_export_filters, parse_export_format, stream_export,
+)
+from .nearby import NEARBY_LIMIT, NEARBY_MAX_LIMIT, NEARBY_MAX_RADIUS, NEARBY_RADIUS, nearby, parse_nearby_params
+from .pagination import KeysetPagination
+from .routers import read_replica
+from .locations import LocationPing, location_coalescer
+from .serializers import (
+    DeliveryResponseSerializer, DeliverySerializer, DeliveryStatusUpdateSerializer, LocationPingSerializer,
+)
+from .tasks import import_deliveries_task
+from .transitions import TransitionConflict, update_delivery
 
 # Create your views here.
 
+def metrics(request):
+    """Prometheus scrape endpoint for the metrics recorded by this process."""
+    return HttpResponse(registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+def delivery_response(delivery, message, status_code=status.HTTP_200_OK):
+    # Accepts either an instance or an already serialised (e.g. cached) payload.
+    if isinstance(delivery, Delivery):
+        delivery = DeliveryResponseSerializer(delivery).data
+    return Response(
+        {
+            "message": message,
+            "delivery": delivery
+        },
+        status=status_code
+    )
+
+
+PROJECTABLE_FIELDS = DeliverySerializer.Meta.fields + ['id', 'estimated_delivery_time', 'created_at', 'updated_at']
+
+
+def parse_projection(fields):
+    if not fields:
+        return DeliverySerializer.Meta.fields
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in PROJECTABLE_FIELDS]
+    if unknown:
+        raise ValidationError({'fields': f"Unknown field(s): {', '.join(unknown)}"})
+    return fields
+
+
+def projection_values(queryset, fields):
+    # Rows come back as dicts, and only the requested columns (plus the cursor key) are read.
+    return queryset.values(*dict.fromkeys(['id', 'created_at', *fields]))
+
+
+def project(rows, fields):
+    return [{field: row[field] for field in fields} for row in rows]
+
+
 class RootAPIView(APIView):
     permission_classes = [AllowAny]
 
@@ -22,8 +81,13 @@ class RootAPIView(APIView):
     def get(self, request, *args, **kwargs):
         api_urls = {
             "Create Delivery": request.build_absolute_uri(reverse_lazy('create-delivery')),
+            "Bulk Create Deliveries": request.build_absolute_uri(reverse_lazy('bulk-create-deliveries')),
+            "Bulk Update Delivery Status": request.build_absolute_uri(reverse_lazy('bulk-update-delivery-status')),
             "Delivery Detail": request.build_absolute_uri(reverse_lazy('delivery-detail', args=[1])),
+            "Delivery Location": request.build_absolute_uri(reverse_lazy('delivery-location', args=[1])),
             "Order Deliveries": request.build_absolute_uri(reverse_lazy('order-deliveries', args=[1])),
+            "Export Deliveries": request.build_absolute_uri(reverse_lazy('export-deliveries')),
+            "Nearby Deliveries": request.build_absolute_uri(reverse_lazy('nearby-deliveries')),
         }
         return Response(api_urls, status=status.HTTP_200_OK)
 
@@ -48,72 +112,193 @@ class DeliveryCreateView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
+        return delivery_response(serializer.instance, "Delivery record created successfully", status.HTTP_201_CREATED)
+
 
-        delivery = Delivery.objects.get(id=serializer.instance.id)
-        
+def read_from_primary(instance):
+    # A lagging replica could put a row the write path just invalidated back into the cache.
+    return instance._state.db == DEFAULT_DB_ALIAS
+
+
+class ReplicaReadMixin:
+    """Serve GET and HEAD requests from the read replica, when one is configured."""
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return super().dispatch(request, *args, **kwargs)
+        with read_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class BulkRequestMixin:
+    max_bulk_size = 10000
+
+    def get_items(self, request):
+        if not isinstance(request.data, list):
+            raise ValidationError({'detail': 'Expected a list of items.'})
+        if len(request.data) > self.max_bulk_size:
+            raise ValidationError({'detail': f'At most {self.max_bulk_size} items can be sent per request.'})
+        return request.data
+
+    def bulk_response(self, message, results, succeeded, success_status):
+        failed = len(results) - succeeded
         return Response(
             {
-                "message": "Delivery record created successfully",
-                "delivery": {
-                    'delivery_id': delivery.id,
-                    "order id": delivery.order_id,
-                    "payment method": delivery.payment_method,
-                    "status": delivery.status,
-                    "current location": delivery.current_location,
-                    'estimated_delivery_time': delivery.estimated_delivery_time,
-                    "delivery method": delivery.delivery_method,
-                    'created date': delivery.created_at
-                }
+                "message": message,
+                "succeeded": succeeded,
+                "failed": failed,
+                "results": results
             },
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_207_MULTI_STATUS if failed else success_status
         )
 
 
-class DeliveryDetailView(generics.RetrieveUpdateAPIView):
+class DeliveryBulkCreateView(BulkRequestMixin, generics.GenericAPIView):
+    serializer_class = DeliverySerializer
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Bulk Create Deliveries",
+        operation_description="Create many delivery records in one request. Valid items are inserted "
+                              "in chunked transactions; every item gets its own result. Send "
+                              "`Prefer: respond-async` to run the import in a Celery worker instead "
+                              "and poll the returned status URL for the results.",
+        request_body=DeliverySerializer(many=True),
+        responses={
+            201: 'All deliveries created',
+            202: 'Import queued',
+            207: 'Some items failed validation, see the per-item results',
+            400: 'Bad Request - Payload is not a list or is too large'
+        },
+        tags=['Delivery']
+    )
+    def post(self, request, *args, **kwargs):
+        items = self.get_items(request)
+        if 'respond-async' in request.headers.get('Prefer', ''):
+            task = import_deliveries_task.delay(items)
+            return Response(
+                {
+                    "message": "Delivery import queued",
+                    "task_id": task.id,
+                    "status_url": request.build_absolute_uri(reverse_lazy('bulk-import-status', args=[task.id]))
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
+        results, succeeded = import_deliveries(items)
+        return self.bulk_response("Delivery records created", results, succeeded, status.HTTP_201_CREATED)
+
+
+class DeliveryBulkImportStatusView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Bulk Import Status",
+        operation_description="State of a queued bulk import, with the per-item results once it has finished.",
+        responses={200: openapi.Response('Successful operation', schema=openapi.Schema(type=openapi.TYPE_OBJECT))},
+        tags=['Delivery']
+    )
+    def get(self, request, task_id, *args, **kwargs):
+        result = import_deliveries_task.AsyncResult(task_id)
+        data = {"task_id": task_id, "state": result.state}
+        if result.successful():
+            data.update(result.result)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class DeliveryBulkStatusView(BulkRequestMixin, generics.GenericAPIView):
+    serializer_class = DeliveryStatusUpdateSerializer
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Bulk Update Delivery Status",
+        operation_description="Update the status of many deliveries in one request.",
+        request_body=DeliveryStatusUpdateSerializer(many=True),
+        responses={
+            200: 'All statuses updated',
+            207: 'Some items were invalid, not found or not allowed to move to the new status, see the per-item results',
+            400: 'Bad Request - Payload is not a list or is too large'
+        },
+        tags=['Delivery']
+    )
+    def patch(self, request, *args, **kwargs):
+        results = []
+        updates = {}
+        for item in self.get_items(request):
+            serializer = self.get_serializer(data=item)
+            if serializer.is_valid():
+                updates[serializer.validated_data['id']] = serializer.validated_data['status']
+                results.append({'id': serializer.validated_data['id']})
+            else:
+                results.append({'id': item.get('id') if isinstance(item, dict) else None, 'errors': serializer.errors})
+
+        updated, conflicts = bulk_update_status(updates)
+        succeeded = 0
+        for index, result in enumerate(results):
+            if 'errors' in result:
+                continue
+            if result['id'] in updated:
+                results[index] = {'id': result['id'], 'status': updates[result['id']]}
+                succeeded += 1
+            elif result['id'] in conflicts:
+                message = TransitionConflict(conflicts[result['id']], updates[result['id']]).detail
+                results[index] = {'id': result['id'], 'errors': {'status': [message]}}
+            else:
+                results[index] = {'id': result['id'], 'errors': {'id': ['Delivery not found']}}
+
+        return self.bulk_response("Delivery statuses updated", results, succeeded, status.HTTP_200_OK)
+
+
+class DeliveryDetailView(ReplicaReadMixin, generics.RetrieveUpdateAPIView):
     queryset = Delivery.objects.all()
     serializer_class = DeliverySerializer
     permission_classes = [AllowAny]
-    lookup_field = 'delivery_id'
+    lookup_url_kwarg = 'delivery_id'
+
+    def perform_update(self, serializer):
+        update_delivery(serializer.instance, **serializer.validated_data)
 
     @swagger_auto_schema(
         operation_summary="Retrieve Delivery",
         operation_description="Retrieve detailed information of a specific delivery by its delivery ID.",
         responses={
             200: openapi.Response('Successful operation', schema=DeliverySerializer),
+            304: "Not modified since the ETag sent in If-None-Match",
             404: "Delivery not found"
         },
         tags=['Delivery']
     )
     def get(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        delivery = Delivery.objects.get(id=serializer.instance.id)
+        entry = delivery_cache.get(kwargs[self.lookup_url_kwarg])
+        if entry is None:
+            version = delivery_cache.version(kwargs[self.lookup_url_kwarg])
+            instance = self.get_object()
+            etag, payload = delivery_etag(instance), None
+        else:
+            etag, payload = entry
 
-        return Response(
-            {
-                "message": "Delivery information retrieved successfully",
-                "delivery": {
-                    'delivery_id': delivery.id,
-                    "order id": delivery.order_id,
-                    "payment method": delivery.payment_method,
-                    "status": delivery.status,
-                    "current location": delivery.current_location,
-                    'estimated_delivery_time': delivery.estimated_delivery_time,
-                    "delivery method": delivery.delivery_method,
-                    'created date': delivery.created_at
-                }
-            },
-            status=status.HTTP_200_OK
-        )
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        if payload is None:
+            payload = dict(DeliveryResponseSerializer(instance).data)
+            if read_from_primary(instance):
+                delivery_cache.set(instance.pk, (etag, payload), version)
+        response = delivery_response(payload, "Delivery information retrieved successfully")
+        response['ETag'] = etag
+        return response
 
     @swagger_auto_schema(
         operation_summary="Update Delivery",
-        operation_description="Update the details of an existing delivery.",
+        operation_description="Update the status of an existing delivery. Statuses move "
+                              "on_hold -> ready -> on_the_way -> delivered, and can be cancelled "
+                              "until delivered.",
         request_body=DeliverySerializer,
         responses={
             200: openapi.Response('Successful operation', schema=DeliverySerializer),
             400: "Invalid input",
-            404: "Delivery not found"
+            404: "Delivery not found",
+            409: "The status cannot move to the requested one, or changed concurrently"
         },
         tags=['Delivery']
     )
@@ -128,24 +313,7 @@ class DeliveryDetailView(generics.RetrieveUpdateAPIView):
         serializer = self.get_serializer(instance, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
         self.perform_update(serializer)
-        delivery = Delivery.objects.get(id=serializer.instance.id)
-
-        return Response(
-            {
-                "message": "Delivery status updated successfully",
-                "delivery": {
-                    'delivery_id': delivery.id,
-                    "order id": delivery.order_id,
-                    "payment method": delivery.payment_method,
-                    "status": delivery.status,
-                    "current location": delivery.current_location,
-                    'estimated_delivery_time': delivery.estimated_delivery_time,
-                    "delivery method": delivery.delivery_method,
-                    'created date': delivery.created_at
-                }
-            },
-            status=status.HTTP_200_OK
-        )
+        return delivery_response(serializer.instance, "Delivery status updated successfully")
 
     @swagger_auto_schema(
         operation_summary="Partial Update Delivery",
@@ -154,7 +322,8 @@ class DeliveryDetailView(generics.RetrieveUpdateAPIView):
         responses={
             200: openapi.Response('Successful operation', schema=DeliverySerializer),
             400: "Invalid input",
-            404: "Delivery not found"
+            404: "Delivery not found",
+            409: "The status cannot move to the requested one, or changed concurrently"
         },
         tags=['Delivery']
     )
@@ -162,51 +331,151 @@ class DeliveryDetailView(generics.RetrieveUpdateAPIView):
         instance = self.get_object()
         serializer = self.get_serializer(instance, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
-        delivery = Delivery.objects.get(id=serializer.instance.id)
+        self.perform_update(serializer)
+        return delivery_response(serializer.instance, "Delivery status partially updated successfully")
 
-        return Response(
-            {
-                "message": "Delivery status partially updated successfully",
-                "delivery": {
-                    'delivery_id': delivery.id,
-                    "order id": delivery.order_id,
-                    "payment method": delivery.payment_method,
-                    "status": delivery.status,
-                    "current location": delivery.current_location,
-                    'estimated_delivery_time': delivery.estimated_delivery_time,
-                    "delivery method": delivery.delivery_method,
-                    'created date': delivery.created_at
-                }
-            },
-            status=status.HTTP_200_OK
-        )
+
+def accept_location_ping(delivery_id, data):
+    serializer = LocationPingSerializer(data=data)
+    serializer.is_valid(raise_exception=True)
+    data = serializer.validated_data
+    location_coalescer.add(LocationPing(
+        delivery_id, data.get('location'), data.get('recorded_at') or timezone.now(),
+        data.get('latitude'), data.get('longitude')
+    ))
+
+
+class DeliveryLocationView(APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Report Courier Location",
+        operation_description="Record a courier location ping for a delivery: an address, coordinates "
+                              "or both. Pings are coalesced in memory, the latest per delivery wins, and "
+                              "written within a second, without recomputing the ETA.",
+        request_body=LocationPingSerializer,
+        responses={
+            202: 'Location accepted',
+            400: 'Invalid input'
+        },
+        tags=['Delivery']
+    )
+    def post(self, request, delivery_id, *args, **kwargs):
+        accept_location_ping(delivery_id, request.data)
+        return Response({"message": "Location accepted"}, status=status.HTTP_202_ACCEPTED)
 
 
-class OrderDeliveriesListView(generics.ListAPIView):
+class OrderDeliveriesListView(ReplicaReadMixin, generics.ListAPIView):
     serializer_class = DeliverySerializer
     permission_classes = [AllowAny]
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         order_id = self.kwargs['orderId']
         return Delivery.objects.filter(order_id=order_id)
 
+    def get_projection(self):
+        return parse_projection(self.request.GET.get('fields'))
+
     @swagger_auto_schema(
         operation_summary="List Deliveries for Order",
-        operation_description="Retrieve a list of deliveries associated with a specific order ID.",
+        operation_description="Retrieve a list of deliveries associated with a specific order ID, "
+                              "oldest first and paginated by cursor.",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, description="Cursor taken from the previous page's `next` link", type=openapi.TYPE_STRING),
+            openapi.Parameter('page_size', openapi.IN_QUERY, description="Deliveries per page (max 500)", type=openapi.TYPE_INTEGER),
+            openapi.Parameter('fields', openapi.IN_QUERY, description="Comma separated list of fields to return", type=openapi.TYPE_STRING),
+        ],
         responses={
             200: openapi.Response('Successful operation', schema=DeliverySerializer(many=True)),
+            304: "Not modified since the ETag sent in If-None-Match",
+            400: "Unknown field requested",
             404: "Order not found"
         },
         tags=['Delivery']
     )
     def list(self, request, *args, **kwargs):
-        queryset = self.get_queryset()
-        serializer = self.get_serializer(queryset, many=True)
+        fields = self.get_projection()
+        etag = queryset_etag(self.get_queryset(), request.META.get('QUERY_STRING', ''))
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        page = self.paginate_queryset(projection_values(self.get_queryset(), fields))
         return Response(
             {
                 "message": "Delivery information for order retrieved successfully",
-                "deliveries": serializer.data
+                "deliveries": project(page, fields),
+                "next": self.paginator.get_next_link()
+            },
+            status=status.HTTP_200_OK,
+            headers={'ETag': etag}
+        )
+
+
+class DeliveryExportView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Export Deliveries",
+        operation_description="Stream every delivery matching the filters, in id order, as newline "
+                              "delimited JSON or CSV. Rows are read in chunks, so memory use does not "
+                              "grow with the size of the export.",
+        manual_parameters=[
+            openapi.Parameter('output', openapi.IN_QUERY, description="`ndjson` (default) or `csv`", type=openapi.TYPE_STRING),
+            openapi.Parameter('status', openapi.IN_QUERY, description="Comma separated statuses to include", type=openapi.TYPE_STRING),
+            openapi.Parameter('updated_since', openapi.IN_QUERY, description="Only deliveries updated at or after this ISO 8601 date or datetime", type=openapi.TYPE_STRING),
+            openapi.Parameter('updated_before', openapi.IN_QUERY, description="Only deliveries updated before this ISO 8601 date or datetime", type=openapi.TYPE_STRING),
+        ],
+        responses={
+            200: 'Streamed export',
+            400: 'Invalid filter or output format'
+        },
+        tags=['Delivery']
+    )
+    def get(self, request, *args, **kwargs):
+        export_format = parse_export_format(request.GET.get('output'))
+        queryset = export_queryset(**parse_export_filters(request.GET))
+        # Rows are read after this method returns, outside read_replica(), so pin the database now.
+        rows = queryset.using(queryset.db).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            stream_export(rows, export_format),
+            content_type=EXPORT_CONTENT_TYPES[export_format],
+            headers={'Content-Disposition': f'attachment; filename="deliveries.{export_format}"'}
+        )
+
+
+class NearbyDeliveriesView(ReplicaReadMixin, APIView):
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_summary="Nearby Deliveries",
+        operation_description="Active deliveries within `radius` metres of a point, nearest first, each with "
+                              "its `distance` in metres. Candidates are looked up through the geohash index, "
+                              "so only deliveries in the surrounding cells are ranked.",
+        manual_parameters=[
+            openapi.Parameter('lat', openapi.IN_QUERY, description="Latitude of the point", type=openapi.TYPE_NUMBER, required=True),
+            openapi.Parameter('lng', openapi.IN_QUERY, description="Longitude of the point", type=openapi.TYPE_NUMBER, required=True),
+            openapi.Parameter('radius', openapi.IN_QUERY, description=f"Search radius in metres (default {NEARBY_RADIUS}, max {NEARBY_MAX_RADIUS})", type=openapi.TYPE_NUMBER),
+            openapi.Parameter('limit', openapi.IN_QUERY, description=f"Deliveries to return (default {NEARBY_LIMIT}, max {NEARBY_MAX_LIMIT})", type=openapi.TYPE_INTEGER),
+        ],
+        responses={
+            200: openapi.Response('Successful operation', schema=DeliverySerializer(many=True)),
+            400: "Missing or invalid parameter"
+        },
+        tags=['Delivery']
+    )
+    def get(self, request, *args, **kwargs):
+        results = nearby(**parse_nearby_params(request.GET))
+        deliveries = []
+        for delivery, distance in results:
+            data = DeliveryResponseSerializer(delivery).data
+            data['distance'] = round(distance, 1)
+            deliveries.append(data)
+        return Response(
+            {
+                "message": "Nearby deliveries retrieved successfully",
+                "deliveries": deliveries
             },
             status=status.HTTP_200_OK
         )
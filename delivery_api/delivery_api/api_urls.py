@@ -0,0 +1,8 @@
+"""
+URL configuration for the lean API handler, which only serves /api/.
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/', include('delivery.urls')),
+]
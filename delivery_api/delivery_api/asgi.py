@@ -2,6 +2,8 @@
 ASGI config for delivery_api project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Requests under /api/ are served by a handler with the lean ``API_MIDDLEWARE``
+stack; everything else goes through the full ``MIDDLEWARE``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
@@ -9,8 +11,12 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'delivery_api.settings')
 
-application = get_asgi_application()
+django.setup(set_prefix=False)
+
+from delivery_api.handlers import APIASGIHandler, AsyncAPIDispatcher, DeliveryASGIHandler  # noqa: E402
+
+application = AsyncAPIDispatcher(APIASGIHandler(), DeliveryASGIHandler())
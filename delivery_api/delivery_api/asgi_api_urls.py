@@ -0,0 +1,8 @@
+"""
+URL configuration for the lean API handler under ASGI, with the async views.
+"""
+from django.urls import include, path
+
+urlpatterns = [
+    path('api/', include('delivery.async_urls')),
+]
@@ -0,0 +1,13 @@
+"""
+URL configuration used by the ASGI application.
+
+It is the regular configuration with the delivery API routed to the async
+views; under WSGI the project keeps using delivery_api.urls.
+"""
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('delivery.async_urls')),
+] + wsgi_urlpatterns
@@ -0,0 +1,116 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.core.handlers.wsgi import WSGIHandler
+from django.utils.module_loading import import_string
+
+API_PREFIX = '/api/'
+
+
+class DeliveryASGIHandler(ASGIHandler):
+    """ASGI handler that resolves requests against the async URL configuration."""
+
+    urlconf = 'delivery_api.asgi_urls'
+
+    async def get_response_async(self, request):
+        request.urlconf = self.urlconf
+        return await super().get_response_async(request)
+
+
+class APIMiddlewareMixin:
+    """
+    Builds the handler's middleware chain from ``API_MIDDLEWARE`` instead of
+    ``MIDDLEWARE``. This is Django's ``BaseHandler.load_middleware`` with the
+    setting it reads swapped; settings themselves are never modified.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+
+        get_response = self._get_response_async if is_async else self._get_response
+        handler = convert_exception_to_response(get_response)
+        handler_is_async = is_async
+        for middleware_path in reversed(settings.API_MIDDLEWARE):
+            middleware = import_string(middleware_path)
+            middleware_can_sync = getattr(middleware, 'sync_capable', True)
+            middleware_can_async = getattr(middleware, 'async_capable', False)
+            if not middleware_can_sync and not middleware_can_async:
+                raise RuntimeError(
+                    'Middleware %s must have at least one of sync_capable/async_capable set to True.' % middleware_path
+                )
+            elif not handler_is_async and middleware_can_sync:
+                middleware_is_async = False
+            else:
+                middleware_is_async = middleware_can_async
+            try:
+                adapted_handler = self.adapt_method_mode(
+                    middleware_is_async, handler, handler_is_async,
+                    debug=settings.DEBUG, name='middleware %s' % middleware_path,
+                )
+                mw_instance = middleware(adapted_handler)
+            except MiddlewareNotUsed:
+                continue
+            handler = adapted_handler
+
+            if mw_instance is None:
+                raise ImproperlyConfigured('Middleware factory %s returned None.' % middleware_path)
+
+            if hasattr(mw_instance, 'process_view'):
+                self._view_middleware.insert(0, self.adapt_method_mode(is_async, mw_instance.process_view))
+            if hasattr(mw_instance, 'process_template_response'):
+                self._template_response_middleware.append(
+                    self.adapt_method_mode(is_async, mw_instance.process_template_response)
+                )
+            if hasattr(mw_instance, 'process_exception'):
+                # Django runs exception middleware synchronously.
+                self._exception_middleware.append(self.adapt_method_mode(False, mw_instance.process_exception))
+
+            handler = convert_exception_to_response(mw_instance)
+            handler_is_async = middleware_is_async
+
+        handler = self.adapt_method_mode(is_async, handler, handler_is_async)
+        # Assigned last: Django treats it as the "initialisation done" flag.
+        self._middleware_chain = handler
+
+
+class APIWSGIHandler(APIMiddlewareMixin, WSGIHandler):
+    """WSGI handler for /api/ only: lean middleware and the API URL configuration."""
+
+    urlconf = 'delivery_api.api_urls'
+
+    def get_response(self, request):
+        request.urlconf = self.urlconf
+        return super().get_response(request)
+
+
+class APIASGIHandler(APIMiddlewareMixin, DeliveryASGIHandler):
+    """ASGI handler for /api/ only: lean middleware and the async API views."""
+
+    urlconf = 'delivery_api.asgi_api_urls'
+
+
+class APIDispatcher:
+    """WSGI application sending /api/ requests to ``api`` and the rest (admin, docs, metrics) to ``default``."""
+
+    def __init__(self, api, default):
+        self.api = api
+        self.default = default
+
+    def __call__(self, environ, start_response):
+        application = self.api if environ.get('PATH_INFO', '').startswith(API_PREFIX) else self.default
+        return application(environ, start_response)
+
+
+class AsyncAPIDispatcher(APIDispatcher):
+    """ASGI counterpart of ``APIDispatcher``; lifespan and other non-HTTP scopes go to ``default``."""
+
+    async def __call__(self, scope, receive, send):
+        path = scope.get('path', '')
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        api = scope['type'] == 'http' and path.startswith(API_PREFIX)
+        await (self.api if api else self.default)(scope, receive, send)
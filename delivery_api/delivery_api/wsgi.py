@@ -2,6 +2,8 @@
 WSGI config for delivery_api project.
 
 It exposes the WSGI callable as a module-level variable named ``application``.
+Requests under /api/ are served by a handler with the lean ``API_MIDDLEWARE``
+stack; everything else goes through the full ``MIDDLEWARE``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
@@ -9,8 +11,14 @@ https://docs.djangoproject.com/en/5.0/howto/deployment/wsgi/
 
 import os
 
-from django.core.wsgi import get_wsgi_application
+import django
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'delivery_api.settings')
 
-application = get_wsgi_application()
+django.setup(set_prefix=False)
+
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+
+from delivery_api.handlers import APIDispatcher, APIWSGIHandler  # noqa: E402
+
+application = APIDispatcher(APIWSGIHandler(), WSGIHandler())